@@ -0,0 +1,464 @@
+"""JSON API для справок, студентов и факультетов (монтируется в /api рядом с HTML-приложением).
+
+GET  /api/<ресурс>            список с фильтрами и keyset-пагинацией
+GET  /api/<ресурс>/<id>       одна запись
+GET  /api/reports             суммы и количество справок по факультетам и месяцам
+POST /api/<ресурс>            массовое создание: JSON-массив записей
+PUT  /api/<ресурс>            массовое изменение: JSON-массив записей с полем id
+
+Массовые запросы выполняются в одной транзакции. Некорректные записи не
+прерывают пакет: для каждой записи в ответе есть либо id, либо текст ошибки.
+"""
+import inspect
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import cherrypy
+from peewee import IntegrityError, chunked
+
+from models import db, Department, Student, Scholarship
+from caching import page_cache
+from reports import monthly_totals, grand_total
+from web_app import (DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, parse_cursor, paginate_scholarships,
+                     parse_date_param)
+
+MAX_BULK_RECORDS = 10000
+# Строк на один INSERT (в пределах лимита переменных SQLite)
+INSERT_BATCH_SIZE = 500
+
+
+def to_json(value):
+    """Преобразует значения, которые json не умеет сериализовать"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def json_handler(*args, **kwargs):
+    """Обработчик tools.json_out: UTF-8 без экранирования кириллицы, даты и Decimal"""
+    value = cherrypy.serving.request._json_inner_handler(*args, **kwargs)
+    return json.dumps(value, ensure_ascii=False, default=to_json).encode('utf-8')
+
+
+def json_error(status, message, traceback, version):
+    """Ошибки API отдаются в JSON, а не HTML-страницей CherryPy"""
+    cherrypy.serving.response.headers['Content-Type'] = 'application/json; charset=utf-8'
+    return json.dumps({'status': status, 'error': message}, ensure_ascii=False)
+
+
+# Разбор полей записей
+
+def parse_int(value, name):
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"Поле {name} должно быть целым числом")
+    return value
+
+
+def parse_positive_int(value, name):
+    value = parse_int(value, name)
+    if value < 1:
+        raise ValueError(f"Поле {name} должно быть положительным")
+    return value
+
+
+def parse_amount(value, name):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"Поле {name} должно быть числом")
+    if value < 0:
+        raise ValueError(f"Поле {name} не может быть отрицательным")
+    return value
+
+
+def parse_date(value, name):
+    if not isinstance(value, str):
+        raise ValueError(f"Поле {name} должно быть датой YYYY-MM-DD")
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"Поле {name} должно быть датой YYYY-MM-DD")
+    return value
+
+
+def text_parser(max_length):
+    def parse_text(value, name):
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"Поле {name} должно быть непустой строкой")
+        if len(value) > max_length:
+            raise ValueError(f"Поле {name} длиннее {max_length} символов")
+        return value
+    return parse_text
+
+
+def parse_record(record, fields, partial=False):
+    """Проверяет поля записи по описанию fields; при partial разрешены не все поля"""
+    if not isinstance(record, dict):
+        raise ValueError("Запись должна быть JSON-объектом")
+    unknown = set(record) - set(fields) - {'id'}
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(sorted(unknown))}")
+    values = {}
+    for name, parse in fields.items():
+        if name in record:
+            values[name] = parse(record[name], name)
+        elif not partial:
+            raise ValueError(f"Не указано поле {name}")
+    return values
+
+
+def read_records():
+    """JSON-массив записей из тела запроса (400, если это не массив или он слишком велик)"""
+    records = getattr(cherrypy.serving.request, 'json', None)
+    if not isinstance(records, list):
+        raise cherrypy.HTTPError(400, "Ожидается JSON-массив записей")
+    if len(records) > MAX_BULK_RECORDS:
+        raise cherrypy.HTTPError(413, f"Не более {MAX_BULK_RECORDS} записей за запрос")
+    return records
+
+
+def parse_limit(per_page):
+    try:
+        return min(max(int(per_page), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        raise cherrypy.HTTPError(400, "Некорректный per_page")
+
+
+def existing_ids(model, ids):
+    """Какие из id есть в таблице (одним запросом на пачку)"""
+    found = set()
+    for batch in chunked(list(set(ids)), INSERT_BATCH_SIZE):
+        found.update(pk for pk, in model.select(model.id).where(model.id.in_(batch)).tuples())
+    return found
+
+
+def existing_values(field, values):
+    """Какие значения уникального поля уже заняты"""
+    found = set()
+    for batch in chunked(list(set(values)), INSERT_BATCH_SIZE):
+        found.update(value for value, in field.model.select(field).where(field.in_(batch)).tuples())
+    return found
+
+
+def check_params(handler, params):
+    """400 на параметры запроса, которых нет в сигнатуре обработчика"""
+    accepted = inspect.signature(handler).parameters
+    if any(parameter.kind is parameter.VAR_KEYWORD for parameter in accepted.values()):
+        return
+    unknown = sorted(set(params) - set(accepted))
+    if unknown:
+        raise cherrypy.HTTPError(400, f"Неизвестные параметры: {', '.join(unknown)}")
+
+
+class Resource:
+    """Ресурс API поверх модели peewee: список, чтение, массовое создание и изменение.
+
+    Подклассы задают model, fields (поле -> функция разбора), unique (уникальные
+    поля; по первому из них находятся id созданных записей), references (поле ->
+    модель, на которую оно ссылается), serialize() и list_items().
+    """
+    model = None
+    fields = {}
+    unique = ()
+    references = {}
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out(handler=json_handler)
+    @cherrypy.tools.json_in(force=False)
+    def default(self, item_id=None, **params):
+        method = cherrypy.serving.request.method
+        if item_id is not None:
+            if method != 'GET':
+                raise cherrypy.HTTPError(405)
+            return self.read(item_id)
+        if method == 'GET':
+            check_params(self.list_items, params)
+            return self.list_items(**params)
+        if method == 'POST':
+            return self.bulk_create(read_records())
+        if method == 'PUT':
+            return self.bulk_update(read_records())
+        raise cherrypy.HTTPError(405)
+
+    def select(self):
+        return self.model.select()
+
+    def serialize(self, item):
+        raise NotImplementedError
+
+    def read(self, item_id):
+        try:
+            item = self.select().where(self.model.id == int(item_id)).get()
+        except (ValueError, self.model.DoesNotExist):
+            raise cherrypy.HTTPError(404, "Запись не найдена")
+        return self.serialize(item)
+
+    def list_items(self, **params):
+        raise NotImplementedError
+
+    def check_references(self, rows):
+        """Ошибки ссылок на несуществующие записи: {номер записи: текст}"""
+        errors = {}
+        for name, model in self.references.items():
+            wanted = [values[name] for index, values in rows if name in values]
+            found = existing_ids(model, wanted)
+            for index, values in rows:
+                if name in values and values[name] not in found:
+                    errors[index] = f"{model.__name__} с id {values[name]} не существует"
+        return errors
+
+    def bulk_create(self, records):
+        results = [None] * len(records)
+        rows = []
+        for index, record in enumerate(records):
+            try:
+                rows.append((index, parse_record(record, self.fields)))
+            except ValueError as e:
+                results[index] = {'index': index, 'error': str(e)}
+
+        # IMMEDIATE: проверки уникальности и вставка идут под одной блокировкой записи
+        with db.atomic('IMMEDIATE'):
+            errors = self.check_references(rows)
+            taken = {name: existing_values(getattr(self.model, name), [values[name] for _, values in rows])
+                     for name in self.unique}
+            valid = []
+            for index, values in rows:
+                if index in errors:
+                    continue
+                for name in self.unique:
+                    if values[name] in taken[name]:
+                        errors[index] = f"Значение {name}={values[name]} уже занято"
+                        break
+                else:
+                    # Повтор внутри пакета тоже конфликт
+                    for name in self.unique:
+                        taken[name].add(values[name])
+                    valid.append((index, values))
+            for index, message in errors.items():
+                results[index] = {'index': index, 'error': message}
+
+            for batch in chunked([values for _, values in valid], INSERT_BATCH_SIZE):
+                self.model.insert_many(batch).execute()
+
+            key = self.unique[0]
+            key_field = getattr(self.model, key)
+            ids = {}
+            for batch in chunked([values[key] for _, values in valid], INSERT_BATCH_SIZE):
+                ids.update(self.model.select(key_field, self.model.id).where(key_field.in_(batch)).tuples())
+            for index, values in valid:
+                results[index] = {'index': index, 'id': ids[values[key]]}
+
+        if valid:
+            page_cache.invalidate()
+        return {
+            'created': len(valid),
+            'errors': len(records) - len(valid),
+            'results': results,
+        }
+
+    def bulk_update(self, records):
+        results = [None] * len(records)
+        rows = []
+        for index, record in enumerate(records):
+            try:
+                if not isinstance(record, dict) or 'id' not in record:
+                    raise ValueError("Не указано поле id")
+                values = parse_record(record, self.fields, partial=True)
+                rows.append((index, parse_int(record['id'], 'id'), values))
+            except ValueError as e:
+                results[index] = {'index': index, 'error': str(e)}
+
+        updated = 0
+        with db.atomic('IMMEDIATE'):
+            errors = self.check_references([(index, values) for index, _, values in rows])
+            found = existing_ids(self.model, [pk for _, pk, _ in rows])
+            for index, pk, values in rows:
+                if index in errors:
+                    message = errors[index]
+                elif pk not in found:
+                    message = f"Запись с id {pk} не найдена"
+                else:
+                    # Точка сохранения на запись: нарушение уникальности откатывает только ее
+                    try:
+                        with db.atomic():
+                            if values:
+                                self.model.update(values).where(self.model.id == pk).execute()
+                        results[index] = {'index': index, 'id': pk}
+                        updated += 1
+                        continue
+                    except IntegrityError as e:
+                        message = f"Нарушение ограничения: {e}"
+                results[index] = {'index': index, 'error': message}
+
+        if updated:
+            page_cache.invalidate()
+        return {
+            'updated': updated,
+            'errors': len(records) - updated,
+            'results': results,
+        }
+
+
+class ScholarshipsResource(Resource):
+    model = Scholarship
+    unique = ('number',)
+    fields = {
+        'number': parse_positive_int,
+        'date': parse_date,
+        'student': parse_positive_int,
+        'amount': parse_amount,
+        'destination': text_parser(200),
+    }
+    references = {'student': Student}
+
+    def select(self):
+        return (Scholarship
+                .select(Scholarship, Student, Department)
+                .join(Student)
+                .join(Department))
+
+    def serialize(self, scholarship):
+        return {
+            'id': scholarship.id,
+            'number': scholarship.number,
+            'date': scholarship.date,
+            'student': scholarship.student_id,
+            'student_name': scholarship.student.full_name,
+            'department': scholarship.student.department.code,
+            'amount': scholarship.amount,
+            'destination': scholarship.destination,
+        }
+
+    def list_items(self, after=None, before=None, per_page=DEFAULT_PAGE_SIZE, order='asc',
+             date_from=None, date_to=None, department=None, student=None):
+        """Справки постранично по (date, number) с фильтрами по датам, факультету и студенту"""
+        if order not in ('asc', 'desc'):
+            raise cherrypy.HTTPError(400, "order должен быть asc или desc")
+        query = self.select()
+        if date_from:
+            query = query.where(Scholarship.date >= parse_date_param(date_from, 'date_from'))
+        if date_to:
+            query = query.where(Scholarship.date <= parse_date_param(date_to, 'date_to'))
+        if department:
+            query = query.where(Department.code == department)
+        if student:
+            try:
+                query = query.where(Scholarship.student == int(student))
+            except ValueError:
+                raise cherrypy.HTTPError(400, "Некорректный student")
+        items, prev_cursor, next_cursor = paginate_scholarships(
+            query,
+            after=parse_cursor(after) if after else None,
+            before=parse_cursor(before) if before else None,
+            per_page=parse_limit(per_page),
+            order=order
+        )
+        return {
+            'items': [self.serialize(item) for item in items],
+            'prev': prev_cursor,
+            'next': next_cursor,
+        }
+
+
+class StudentsResource(Resource):
+    model = Student
+    unique = ('student_id',)
+    fields = {
+        'full_name': text_parser(200),
+        'student_id': text_parser(20),
+        'department': parse_positive_int,
+    }
+    references = {'department': Department}
+
+    def select(self):
+        return Student.select(Student, Department).join(Department)
+
+    def serialize(self, student):
+        return {
+            'id': student.id,
+            'full_name': student.full_name,
+            'student_id': student.student_id,
+            'department': student.department_id,
+            'department_code': student.department.code,
+            'scholarship_count': student.scholarship_count,
+        }
+
+    def list_items(self, after=None, per_page=DEFAULT_PAGE_SIZE, department=None):
+        """Студенты по возрастанию id; after - id последнего студента предыдущей страницы"""
+        per_page = parse_limit(per_page)
+        query = self.select().order_by(Student.id)
+        if department:
+            query = query.where(Department.code == department)
+        if after:
+            try:
+                query = query.where(Student.id > int(after))
+            except ValueError:
+                raise cherrypy.HTTPError(400, "Некорректный after")
+        items = list(query.limit(per_page + 1))
+        has_more = len(items) > per_page
+        items = items[:per_page]
+        return {
+            'items': [self.serialize(item) for item in items],
+            'next': str(items[-1].id) if has_more else None,
+        }
+
+
+class DepartmentsResource(Resource):
+    model = Department
+    unique = ('code', 'name')
+    fields = {
+        'name': text_parser(100),
+        'code': text_parser(10),
+    }
+
+    def serialize(self, department):
+        return {
+            'id': department.id,
+            'name': department.name,
+            'code': department.code,
+            'student_count': department.student_count,
+        }
+
+    def list_items(self):
+        """Все факультеты (их единицы, пагинация не нужна)"""
+        return {'items': [self.serialize(item) for item in self.select().order_by(Department.id)]}
+
+
+class ReportsResource:
+    """Сводка по факультетам и месяцам (только чтение)"""
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out(handler=json_handler)
+    def default(self, year=None, department=None):
+        if cherrypy.serving.request.method != 'GET':
+            raise cherrypy.HTTPError(405)
+        try:
+            rows = list(monthly_totals(year, department))
+        except ValueError as e:
+            raise cherrypy.HTTPError(400, str(e))
+        count, amount = grand_total(rows)
+        return {
+            'items': [{
+                'month': row.month,
+                'department': row.department.code,
+                'scholarship_count': row.scholarship_count,
+                'total_amount': row.total_amount,
+            } for row in rows],
+            'scholarship_count': count,
+            'total_amount': amount,
+        }
+
+
+class ScholarshipApi:
+    """Корень JSON API"""
+    _cp_config = {
+        'error_page.default': json_error,
+        # POST/PUT на /api/<ресурс> не должны перенаправляться на адрес со слешем
+        'tools.trailing_slash.on': False,
+    }
+
+    scholarships = ScholarshipsResource()
+    students = StudentsResource()
+    departments = DepartmentsResource()
+    reports = ReportsResource()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""Микробенчмарк слоя данных fourth.py и third.py с контролем регрессий.
+
+Для каждой операции и размера входа (число записей синтетического CSV)
+измеряется время прогона, пропускная способность (записей в секунду) и
+пиковый объем памяти, выделенной во время операции (tracemalloc, отдельным
+прогоном). Как в timeit.autorange, в каждом повторе операция выполняется,
+пока суммарное время не достигнет --min-time, и берется среднее время
+прогона; из повторов, которые идут по кругу по всем операциям, выбирается
+лучший. Вход готовится заново перед каждым прогоном и в замер не входит.
+Результаты можно сохранить как эталон и сравнивать с ним последующие
+запуски: при падении пропускной способности или росте пиковой памяти больше
+порога скрипт завершается с кодом 1.
+
+    python benchmark_data.py --sizes 1e3,1e4,1e5,1e6 --save-baseline baseline.json
+    python benchmark_data.py --sizes 1e3,1e4,1e5,1e6 --baseline baseline.json
+
+Размер 1e7 поддерживается, но операции third.py над списком словарей
+требуют на нем несколько гигабайт памяти; их можно исключить через --cases.
+"""
+import argparse
+import csv
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+from datetime import date, datetime, timedelta
+
+import third
+from fourth import CSV_FIELDS, Scholarship, ScholarshipCollection
+
+DEFAULT_SIZES = '1e3,1e4,1e5,1e6'
+# Минимальное суммарное время прогонов в одном повторе, секунды
+DEFAULT_MIN_TIME = 0.2
+# Пороги регрессии относительно эталона
+DEFAULT_MAX_SLOWDOWN = 0.2
+DEFAULT_MAX_MEMORY_GROWTH = 0.1
+# Рост пиковой памяти меньше этого не считается регрессией (шум на малых размерах)
+MEMORY_NOISE_BYTES = 64 * 1024
+
+SURNAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Соколов']
+FIRST_NAMES = ['Александр', 'Дмитрий', 'Максим', 'Сергей', 'Андрей', 'Алексей', 'Артем', 'Илья']
+PATRONYMICS = ['Александрович', 'Дмитриевич', 'Сергеевич', 'Андреевич', 'Иванович']
+DESTINATIONS = ['по месту требования', 'в банк', 'в военкомат', 'в деканат', 'в общежитие']
+FIRST_DATE = date(2020, 1, 1)
+DAYS = 6 * 365
+HIGH_THRESHOLD = 3000
+
+
+def parse_sizes(text):
+    """Размеры через запятую; допускается запись вида 1e6"""
+    return [int(float(size)) for size in text.split(',')]
+
+
+def synthetic_rows(count, seed=0):
+    """Кортежи (номер, дата, ФИО, сумма, куда выдается) синтетических справок"""
+    rng = random.Random(seed)
+    dates = [str(FIRST_DATE + timedelta(days=day)) for day in range(DAYS)]
+    return [(number,
+             rng.choice(dates),
+             f'{rng.choice(SURNAMES)} {rng.choice(FIRST_NAMES)} {rng.choice(PATRONYMICS)}',
+             round(rng.uniform(1000, 5000), 2),
+             rng.choice(DESTINATIONS)) for number in range(1, count + 1)]
+
+
+def synthetic_csv(workdir, count):
+    """CSV файл из count синтетических справок (создается один раз на размер)"""
+    filename = os.path.join(workdir, f'data_{count}.csv')
+    if not os.path.exists(filename):
+        with open(filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            writer.writerows(synthetic_rows(count))
+    return filename
+
+
+class Inputs:
+    """Входные данные одного размера, готовятся лениво и переиспользуются операциями"""
+
+    def __init__(self, workdir, size):
+        self.workdir = workdir
+        self.size = size
+        self._rows = self._collection = self._records = None
+
+    @property
+    def filename(self):
+        return synthetic_csv(self.workdir, self.size)
+
+    @property
+    def rows(self):
+        if self._rows is None:
+            self._rows = synthetic_rows(self.size)
+        return self._rows
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = ScholarshipCollection.create_from_csv(self.filename)
+        # Индексы сортировки и ключи casefold строятся лениво; сбрасываем их,
+        # чтобы мерить холодную сортировку
+        self._collection._by_name = self._collection._by_amount = None
+        self._collection._name_keys = {}
+        return self._collection
+
+    @property
+    def records(self):
+        if self._records is None:
+            self._records = third.read_data(self.filename)
+        return self._records
+
+
+def consume(iterator):
+    deque(iterator, maxlen=0)
+
+
+# Операция: имя -> (подготовка входа без замера, замеряемая функция)
+CASES = {
+    'fourth.Scholarship.__init__': (
+        lambda inputs: inputs.rows,
+        lambda rows: [Scholarship(*row) for row in rows]),
+    'fourth.create_from_csv': (
+        lambda inputs: inputs.filename,
+        ScholarshipCollection.create_from_csv),
+    'fourth.sort_by_name_generator': (
+        lambda inputs: inputs.collection,
+        lambda collection: consume(collection.sort_by_name_generator())),
+    'fourth.sort_by_amount_generator': (
+        lambda inputs: inputs.collection,
+        lambda collection: consume(collection.sort_by_amount_generator())),
+    'fourth.get_high_scholarships_generator': (
+        lambda inputs: inputs.collection,
+        lambda collection: consume(collection.get_high_scholarships_generator(HIGH_THRESHOLD))),
+    'third.read_data': (
+        lambda inputs: inputs.filename,
+        third.read_data),
+    'third.sort_by_string_field': (
+        lambda inputs: inputs.records,
+        lambda records: third.sort_by_string_field(records, 'ФИО студента')),
+    'third.sort_by_numeric_field': (
+        lambda inputs: inputs.records,
+        lambda records: third.sort_by_numeric_field(records, 'размер стипендии')),
+    'third.filter_by_scholarship': (
+        lambda inputs: inputs.records,
+        lambda records: third.filter_by_scholarship(records, HIGH_THRESHOLD)),
+}
+
+
+def autorange(prepare, run, inputs, min_time):
+    """Прогоны до суммарного времени min_time; возвращает (среднее время прогона, число прогонов)"""
+    total = 0.0
+    loops = 0
+    gc.collect()
+    # Как в timeit: сборщик циклов не срабатывает посреди замера в случайный момент
+    gc.disable()
+    try:
+        while total < min_time or not loops:
+            argument = prepare(inputs)
+            started = time.perf_counter()
+            result = run(argument)
+            total += time.perf_counter() - started
+            del result, argument
+            loops += 1
+    finally:
+        gc.enable()
+    return total / loops, loops
+
+
+def peak_memory(prepare, run, inputs):
+    """Пиковая память, выделенная за один прогон (tracemalloc)"""
+    argument = prepare(inputs)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = run(argument)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak
+
+
+def repeats_for(size, repeats):
+    """Меньше повторов на больших размерах: на них разброс времени меньше"""
+    if size >= 1000000:
+        return 1
+    if size >= 100000:
+        return min(repeats, 3)
+    return repeats
+
+
+def run_benchmarks(sizes, cases, repeats, workdir, min_time=DEFAULT_MIN_TIME, out=sys.stdout):
+    results = {}
+    for size in sizes:
+        inputs = Inputs(workdir, size)
+        best = {}
+        # Повторы идут по кругу по всем операциям, чтобы временное замедление машины
+        # попадало в один повтор нескольких операций, а не во все повторы одной
+        for _ in range(repeats_for(size, repeats)):
+            for name in cases:
+                prepare, run = CASES[name]
+                elapsed, loops = autorange(prepare, run, inputs, min_time)
+                if name not in best or elapsed < best[name][0]:
+                    best[name] = (elapsed, loops)
+        for name in cases:
+            seconds, loops = best[name]
+            stats = {
+                'seconds': seconds,
+                'loops': loops,
+                'rows_per_second': size / seconds if seconds else None,
+                'peak_bytes': peak_memory(*CASES[name], inputs),
+            }
+            results.setdefault(name, {})[str(size)] = stats
+            print(f"{name:<40} {size:>10} {stats['seconds'] * 1000:>11.3f} мс x{stats['loops']:<5} "
+                  f"{stats['rows_per_second']:>13,.0f} зап/с {stats['peak_bytes'] / 2 ** 20:>9.1f} МБ",
+                  file=out)
+    return results
+
+
+def find_regressions(results, baseline, max_slowdown, max_memory_growth):
+    """Список описаний регрессий относительно эталона (сравниваются общие операции и размеры)"""
+    regressions = []
+    for name, by_size in results.items():
+        for size, stats in by_size.items():
+            old = baseline.get(name, {}).get(size)
+            if not old:
+                continue
+            if old['rows_per_second'] and stats['rows_per_second'] < old['rows_per_second'] * (1 - max_slowdown):
+                regressions.append(f"{name} [{size}]: {stats['rows_per_second']:,.0f} зап/с "
+                                   f"вместо {old['rows_per_second']:,.0f}")
+            growth = stats['peak_bytes'] - old['peak_bytes']
+            if growth > MEMORY_NOISE_BYTES and stats['peak_bytes'] > old['peak_bytes'] * (1 + max_memory_growth):
+                regressions.append(f"{name} [{size}]: пиковая память {stats['peak_bytes'] / 2 ** 20:.1f} МБ "
+                                   f"вместо {old['peak_bytes'] / 2 ** 20:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк слоя данных fourth.py / third.py")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help=f"размеры входа через запятую (по умолчанию {DEFAULT_SIZES})")
+    parser.add_argument('--cases', help="операции через запятую (по умолчанию все): " + ', '.join(CASES))
+    parser.add_argument('--repeats', type=int, default=5, help="повторов на размер, берется лучшее время")
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME,
+                        help=f"минимальное суммарное время прогонов в повторе, с (по умолчанию {DEFAULT_MIN_TIME})")
+    parser.add_argument('--workdir', help="каталог для синтетических CSV (по умолчанию временный)")
+    parser.add_argument('--output', help="сохранить результаты в JSON")
+    parser.add_argument('--save-baseline', metavar='PATH', help="сохранить результаты как эталон")
+    parser.add_argument('--baseline', metavar='PATH', help="сравнить с эталоном и завершиться с кодом 1 при регрессии")
+    parser.add_argument('--max-slowdown', type=float, default=DEFAULT_MAX_SLOWDOWN,
+                        help=f"допустимое падение пропускной способности (по умолчанию {DEFAULT_MAX_SLOWDOWN})")
+    parser.add_argument('--max-memory-growth', type=float, default=DEFAULT_MAX_MEMORY_GROWTH,
+                        help=f"допустимый рост пиковой памяти (по умолчанию {DEFAULT_MAX_MEMORY_GROWTH})")
+    args = parser.parse_args()
+
+    cases = args.cases.split(',') if args.cases else list(CASES)
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        raise SystemExit(f"Неизвестные операции: {', '.join(sorted(unknown))}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='benchmark_data.')
+    try:
+        results = run_benchmarks(parse_sizes(args.sizes), cases, args.repeats, workdir, args.min_time)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir)
+
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = find_regressions(results, baseline, args.max_slowdown, args.max_memory_growth)
+        if regressions:
+            print("\nРегрессии относительно эталона:", *regressions, sep='\n  ')
+            sys.exit(1)
+        print("\nРегрессий относительно эталона нет")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""Нагрузочный бенчмарк страниц ScholarshipWebApp и JSON API.
+
+Заполняет отдельную базу синтетическими данными в схеме models.py, запускает
+приложение в этом же процессе и опрашивает каждую страницу несколькими
+параллельными клиентами. Для каждой страницы считаются задержки p50/p95/p99,
+пропускная способность, объем ответа и число SQL-запросов на запрос.
+Результаты сохраняются в JSON и могут сравниваться с прошлым запуском.
+
+Серверный кеш страниц при замере отключен: иначе после первого запроса
+страница отдается из кеша и бенчмарк не видит стоимости ее построения. С
+--page-cache страницы дополнительно проверяются с включенным кешем, эти
+строки отчета помечены " (кеш)".
+
+    python benchmark_web.py --seed --departments 100 --students 1000000 --scholarships 5000000
+    python benchmark_web.py --concurrency 16 --requests 500 --output new.json --compare old.json
+
+Клиенты работают в том же процессе, что и сервер, и делят с ним GIL, поэтому
+абсолютные числа ниже, чем у отдельного сервера; бенчмарк предназначен для
+сравнения запусков между собой.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import threading
+import time
+from urllib.parse import quote
+from datetime import date, datetime, timedelta
+
+import cherrypy
+
+from models import db, configure_database, Department, Student, Scholarship, refresh_counters
+from migrations import migrate_database
+from caching import page_cache
+from web_app import ScholarshipWebApp, subscribe_database, make_cursor
+from api import ScholarshipApi
+
+DEFAULT_DATABASE = 'benchmark.db'
+DEFAULT_PORT = 8089
+SEED_CHUNK_SIZE = 100000
+# Суффикс страниц, проверенных с включенным кешем страниц
+CACHED_SUFFIX = ' (кеш)'
+
+SURNAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Соколов',
+            'Михайлов', 'Новиков', 'Федоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семенов']
+FIRST_NAMES = ['Александр', 'Дмитрий', 'Максим', 'Сергей', 'Андрей', 'Алексей', 'Артем', 'Илья',
+               'Кирилл', 'Михаил', 'Никита', 'Матвей', 'Роман', 'Егор', 'Арсений', 'Иван']
+PATRONYMICS = ['Александрович', 'Дмитриевич', 'Сергеевич', 'Андреевич', 'Алексеевич', 'Иванович',
+               'Михайлович', 'Петрович', 'Николаевич', 'Владимирович']
+DESTINATIONS = ['по месту требования', 'в банк', 'в военкомат', 'в деканат', 'в общежитие',
+                'в налоговую инспекцию', 'в пенсионный фонд', 'в социальную защиту']
+FIRST_DATE = date(2020, 1, 1)
+DAYS = 6 * 365
+
+
+def insert_sql(model, fields):
+    """SQL вставки одной строки; peewee генерирует его один раз на все заполнение.
+
+    fields должны включать все столбцы модели, иначе peewee подставит в SQL
+    значения по умолчанию и число параметров не совпадет со строками.
+    """
+    sql, _ = model.insert_many([tuple(0 for _ in fields)], fields=fields).sql()
+    return sql
+
+
+def insert_rows(sql, rows):
+    """Вставка порции строк одним executemany в отдельной транзакции"""
+    with db.atomic():
+        db.cursor().executemany(sql, rows)
+
+
+def seed_database(path, departments, students, scholarships, seed=0, out=sys.stdout):
+    """Создает базу path и заполняет ее синтетическими данными.
+
+    Таблицы создаются без индексов и триггеров: их (вместе со счетчиками,
+    полнотекстовым индексом и сводкой) строят миграции после заполнения, что
+    намного быстрее поддержки на каждую вставку.
+    """
+    if os.path.exists(path):
+        raise SystemExit(f"{path} уже существует; удалите его или укажите другой --database")
+    rng = random.Random(seed)
+    configure_database(path)
+    started = time.perf_counter()
+    now = str(datetime.now())
+    with db:
+        for model in (Department, Student, Scholarship):
+            model._schema.create_table()
+
+        insert_rows(insert_sql(Department, [Department.id, Department.name, Department.code,
+                                            Department.student_count]),
+                    [(i, f'Факультет {i}', f'F{i:04d}', 0) for i in range(1, departments + 1)])
+
+        sql = insert_sql(Student, [Student.id, Student.full_name, Student.student_id,
+                                   Student.department, Student.scholarship_count, Student.created_at])
+        for start in range(1, students + 1, SEED_CHUNK_SIZE):
+            insert_rows(sql, [(i,
+                               f'{rng.choice(SURNAMES)} {rng.choice(FIRST_NAMES)} {rng.choice(PATRONYMICS)}',
+                               f'S{i:08d}',
+                               rng.randint(1, departments),
+                               0,
+                               now) for i in range(start, min(start + SEED_CHUNK_SIZE, students + 1))])
+            print(f"Студенты: {min(start + SEED_CHUNK_SIZE - 1, students)}", file=out)
+
+        dates = [str(FIRST_DATE + timedelta(days=day)) for day in range(DAYS)]
+        sql = insert_sql(Scholarship, [Scholarship.id, Scholarship.number, Scholarship.date, Scholarship.student,
+                                       Scholarship.amount, Scholarship.destination, Scholarship.created_at])
+        for start in range(1, scholarships + 1, SEED_CHUNK_SIZE):
+            insert_rows(sql, [(i, i,
+                               rng.choice(dates),
+                               rng.randint(1, students),
+                               round(rng.uniform(1000, 5000), 2),
+                               rng.choice(DESTINATIONS),
+                               now) for i in range(start, min(start + SEED_CHUNK_SIZE, scholarships + 1))])
+            print(f"Справки: {min(start + SEED_CHUNK_SIZE - 1, scholarships)}", file=out)
+
+        migrate_database(out=out)
+        refresh_counters()
+    print(f"База {path} заполнена за {time.perf_counter() - started:.1f} с", file=out)
+
+
+def default_endpoints():
+    """Проверяемые страницы: имя -> путь (курсор глубокой страницы берется из данных)"""
+    endpoints = {
+        'index': '/',
+        'students': '/students',
+        'departments': '/departments',
+        'search': f'/search?q={quote(SURNAMES[0][:4])}',
+        'reports': '/reports',
+        'add_scholarship': '/add_scholarship',
+        'student_lookup': f'/student_lookup?q={quote(SURNAMES[0][:3])}',
+        'api_scholarships': '/api/scholarships?per_page=100',
+    }
+    with db:
+        count = Scholarship.select().count()
+        middle = (Scholarship
+                  .select(Scholarship.date, Scholarship.number)
+                  .order_by(Scholarship.date, Scholarship.number)
+                  .offset(count // 2)
+                  .first())
+    if middle is not None:
+        endpoints['index_deep'] = f'/?after={make_cursor(middle)}'
+    return endpoints
+
+
+class QueryCounter:
+    """Считает SQL-запросы, выполненные через db.execute_sql во всех потоках"""
+
+    def __init__(self, database):
+        self.database = database
+        self.count = 0
+        self._lock = threading.Lock()
+        self._execute_sql = database.execute_sql
+
+    def __enter__(self):
+        def execute_sql(sql, params=None):
+            with self._lock:
+                self.count += 1
+            return self._execute_sql(sql, params)
+        self.database.execute_sql = execute_sql
+        return self
+
+    def __exit__(self, *exc_info):
+        self.database.execute_sql = self._execute_sql
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+
+
+def start_server(port, threads):
+    """Запускает приложение и API в этом процессе"""
+    cherrypy.config.update({
+        'environment': 'production',
+        'server.socket_host': '127.0.0.1',
+        'server.socket_port': port,
+        'server.thread_pool': threads,
+        'log.screen': False,
+    })
+    subscribe_database()
+    cherrypy.tree.mount(ScholarshipWebApp(), '/')
+    cherrypy.tree.mount(ScholarshipApi(), '/api')
+    cherrypy.engine.start()
+    cherrypy.engine.wait(cherrypy.engine.states.STARTED)
+
+
+def percentile(sorted_values, q):
+    """Перцентиль q (0-100) с линейной интерполяцией"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def positive_int(value):
+    """Тип аргумента argparse: целое число не меньше 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"нужно целое число не меньше 1, получено {value}")
+    return number
+
+
+def drive(port, path, requests, concurrency, warmup, counter):
+    """Опрашивает path параллельными клиентами; возвращает метрики"""
+    per_client = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    latencies = []
+    totals = {'errors': 0, 'bytes': 0}
+    lock = threading.Lock()
+    ready = threading.Barrier(concurrency + 1)
+
+    def client(count):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+
+        def fetch():
+            connection.request('GET', path)
+            response = connection.getresponse()
+            return response.status, len(response.read())
+
+        try:
+            for _ in range(warmup):
+                fetch()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+        ready.wait()
+        ready.wait()
+        local, errors, size = [], 0, 0
+        for _ in range(count):
+            started = time.perf_counter()
+            try:
+                status, length = fetch()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                status, length = 599, 0
+            local.append(time.perf_counter() - started)
+            errors += status >= 400
+            size += length
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            totals['errors'] += errors
+            totals['bytes'] += size
+
+    clients = [threading.Thread(target=client, args=(count,)) for count in per_client]
+    for thread in clients:
+        thread.start()
+    ready.wait()  # разогрев закончен
+    counter.reset()
+    started = time.perf_counter()
+    ready.wait()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    queries = counter.count
+
+    latencies.sort()
+    done = len(latencies)
+    return {
+        'path': path,
+        'requests': done,
+        'errors': totals['errors'],
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'throughput_rps': done / elapsed,
+        'bytes_per_request': totals['bytes'] / done,
+        'queries_per_request': queries / done,
+    }
+
+
+def database_stats():
+    with db:
+        return {
+            'departments': Department.select().count(),
+            'students': Student.select().count(),
+            'scholarships': Scholarship.select().count(),
+        }
+
+
+def print_results(results, baseline=None, out=sys.stdout):
+    """Таблица результатов; с baseline - с изменением относительно прошлого запуска"""
+    previous = (baseline or {}).get('endpoints', {})
+    print(f"{'страница':<24} {'p50 мс':>9} {'p95 мс':>9} {'p99 мс':>9} {'зап/с':>9} {'SQL/зап':>8} {'КБ':>9} {'ошибки':>7}",
+          file=out)
+    for name, stats in results['endpoints'].items():
+        print(f"{name:<24} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} "
+              f"{stats['throughput_rps']:>9.1f} {stats['queries_per_request']:>8.2f} "
+              f"{stats['bytes_per_request'] / 1024:>9.1f} {stats['errors']:>7}", file=out)
+        old = previous.get(name)
+        if old:
+            def change(key):
+                return f"{(stats[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else 'n/a'
+            print(f"{'  к прошлому':<24} {change('p50_ms'):>9} {change('p95_ms'):>9} {change('p99_ms'):>9} "
+                  f"{change('throughput_rps'):>9} {change('queries_per_request'):>8}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный бенчмарк страниц ScholarshipWebApp")
+    parser.add_argument('--database', default=DEFAULT_DATABASE,
+                        help=f"файл базы для бенчмарка (по умолчанию {DEFAULT_DATABASE})")
+    parser.add_argument('--seed', action='store_true', help="создать и заполнить базу перед запуском")
+    parser.add_argument('--seed-only', action='store_true', help="только заполнить базу")
+    parser.add_argument('--departments', type=int, default=100)
+    parser.add_argument('--students', type=int, default=100000)
+    parser.add_argument('--scholarships', type=int, default=500000)
+    parser.add_argument('--random-seed', type=int, default=0, help="зерно генератора синтетических данных")
+    parser.add_argument('--endpoints', help="имена страниц через запятую (по умолчанию все)")
+    parser.add_argument('--concurrency', type=positive_int, default=8, help="параллельных клиентов")
+    parser.add_argument('--requests', type=positive_int, default=200, help="запросов к каждой странице")
+    parser.add_argument('--warmup', type=int, default=2, help="запросов разогрева на клиента")
+    parser.add_argument('--threads', type=int, default=10, help="рабочих потоков CherryPy")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--page-cache', action='store_true',
+                        help="дополнительно проверить страницы с включенным серверным кешем страниц")
+    parser.add_argument('--output', help="сохранить результаты в JSON")
+    parser.add_argument('--compare', help="JSON прошлого запуска для сравнения")
+    args = parser.parse_args()
+
+    if args.seed or args.seed_only:
+        seed_database(args.database, args.departments, args.students, args.scholarships, args.random_seed)
+        if args.seed_only:
+            return
+    elif not os.path.exists(args.database):
+        raise SystemExit(f"{args.database} не найден; создайте его с --seed")
+    configure_database(args.database)
+
+    endpoints = default_endpoints()
+    if args.endpoints:
+        names = args.endpoints.split(',')
+        unknown = set(names) - set(endpoints)
+        if unknown:
+            raise SystemExit(f"Неизвестные страницы: {', '.join(sorted(unknown))}")
+        endpoints = {name: endpoints[name] for name in names}
+
+    results = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'database': database_stats(),
+        'config': {
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'threads': args.threads,
+            'page_cache': args.page_cache,
+        },
+        'endpoints': {},
+    }
+    # Сначала каждый запрос строит страницу, затем (с --page-cache) страницы отдаются из кеша
+    passes = [('', 0)]
+    if args.page_cache:
+        passes.append((CACHED_SUFFIX, page_cache.max_pages))
+    start_server(args.port, args.threads)
+    try:
+        with QueryCounter(db) as counter:
+            for suffix, max_pages in passes:
+                page_cache.max_pages = max_pages
+                page_cache.invalidate()
+                for name, path in endpoints.items():
+                    results['endpoints'][name + suffix] = drive(args.port, path, args.requests,
+                                                                args.concurrency, args.warmup, counter)
+    finally:
+        cherrypy.engine.exit()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""HTTP-кеширование страниц ScholarshipWebApp.
+
+ETag и Last-Modified страницы вычисляются по счетчикам изменений таблиц
+(models.TableVersion), которые поддерживаются триггерами. Условный GET с
+совпавшим тегом получает 304, а готовые страницы хранятся в серверном кеше,
+пока версии таблиц, из которых они собраны, не изменятся.
+"""
+import calendar
+import functools
+import threading
+from collections import OrderedDict
+
+import cherrypy
+from cherrypy.lib import cptools, httputil
+
+from models import TableVersion
+
+MAX_CACHED_PAGES = 256
+# Страницы больше этого размера (в символах) не кешируются, чтобы не держать
+# в памяти полные выгрузки больших таблиц
+MAX_CACHED_PAGE_SIZE = 4 * 1024 * 1024
+
+
+def table_versions(models):
+    """Версии и время последнего изменения таблиц моделей одним запросом"""
+    names = [model._meta.table_name for model in models]
+    rows = TableVersion.select().where(TableVersion.name.in_(names))
+    versions = {row.name: row for row in rows}
+    return [versions[name] for name in names if name in versions]
+
+
+class PageCache:
+    """LRU-кеш отрисованных страниц; запись действительна только для своего ETag"""
+
+    def __init__(self, max_pages=MAX_CACHED_PAGES, max_page_size=MAX_CACHED_PAGE_SIZE):
+        self.max_pages = max_pages
+        self.max_page_size = max_page_size
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def get(self, key, etag):
+        """Возвращает закешированную страницу, если она собрана для этого ETag"""
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._pages.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, etag, body):
+        """Сохраняет страницу, вытесняя давно не использованные"""
+        if len(body) > self.max_page_size:
+            return
+        with self._lock:
+            self._pages[key] = (etag, body)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+    def tee(self, key, etag, chunks):
+        """Отдает фрагменты потокового ответа и сохраняет собранную страницу в конце"""
+        parts = []
+        size = 0
+        for chunk in chunks:
+            yield chunk
+            if parts is not None:
+                parts.append(chunk)
+                size += len(chunk)
+                if size > self.max_page_size:
+                    parts = None
+        if parts is not None:
+            self.put(key, etag, ''.join(parts))
+
+    def invalidate(self):
+        """Сбрасывает кеш (вызывается после записи в БД)"""
+        with self._lock:
+            self._pages.clear()
+
+
+page_cache = PageCache()
+
+
+def cached_page(*models):
+    """Декоратор GET-обработчика: условные запросы и серверный кеш по версиям таблиц models"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(self, *args, **kwargs):
+            request = cherrypy.serving.request
+            if request.method not in ('GET', 'HEAD'):
+                return handler(self, *args, **kwargs)
+
+            versions = table_versions(models)
+            etag = '"%s"' % '-'.join(f'{row.name}.{row.version}' for row in versions)
+            response = cherrypy.serving.response
+            response.headers['ETag'] = etag
+            response.headers['Cache-Control'] = 'no-cache'
+            if versions:
+                modified = max(row.updated_at for row in versions)
+                response.headers['Last-Modified'] = httputil.HTTPDate(calendar.timegm(modified.timetuple()))
+
+            cptools.validate_etags()
+            # If-Modified-Since учитывается только без If-None-Match (RFC 7232)
+            if 'If-None-Match' not in request.headers:
+                cptools.validate_since()
+
+            key = (request.path_info, request.query_string)
+            body = page_cache.get(key, etag)
+            if body is not None:
+                return body
+            body = handler(self, *args, **kwargs)
+            if isinstance(body, str):
+                page_cache.put(key, etag, body)
+                return body
+            return page_cache.tee(key, etag, body)
+        return wrapper
+    return decorator
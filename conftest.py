@@ -0,0 +1,13 @@
+import pytest
+
+from models import db, configure_database, create_tables
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Пустая база текущей схемы во временном каталоге"""
+    configure_database(str(tmp_path / 'test.db'))
+    create_tables()
+    db.connect(reuse_if_open=True)
+    yield db
+    db.close()
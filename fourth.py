@@ -1,8 +1,38 @@
+import argparse
 import csv
-from datetime import datetime
-from typing import Iterator, List, Optional
+import io
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from heapq import heapify, heappop, nlargest, nsmallest
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 FILENAME = 'data.csv'
+CSV_FIELDS = ['№', 'дата', 'ФИО студента', 'размер стипендии', 'куда выдается справка']
+# Записей в одной пачке iter_csv_batches
+DEFAULT_BATCH_SIZE = 10000
+# Размер куска файла для одного процесса при параллельной загрузке
+PARALLEL_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Двоичный снимок коллекции: заголовок, затем колонки в порядке SNAPSHOT_COLUMNS
+# (каждая выровнена на 8 байт), таблица смещений строк и сами строки в UTF-8.
+# Числа хранятся в порядке байтов машины, записавшей снимок. С версии 2 в
+# заголовке есть размер и mtime_ns CSV, из которого сделан снимок (нули - снимок
+# не из CSV), а снимки версии 1 читаются, но ни одному CSV не соответствуют.
+SNAPSHOT_MAGIC = b'SCHSNAP\0'
+SNAPSHOT_VERSION = 2
+# магия, версия, порядок байтов, резерв, записей, строк
+SNAPSHOT_HEADER_V1 = struct.Struct('<8sHHIQQ')
+# ... и размер, mtime_ns исходного CSV
+SNAPSHOT_HEADER = struct.Struct('<8sHHIQQQq')
+SNAPSHOT_COLUMNS = (('_numbers', 'q'), ('_amounts', 'd'), ('_dates', 'i'), ('_names', 'I'), ('_destinations', 'I'))
 
 
 class Scholarship:
@@ -28,11 +58,11 @@ class Scholarship:
 
     def __repr__(self) -> str:
         """Строковое представление объекта."""
-        return f"Scholarship(№{self._number}, {self._student_name}, {self._amount})"
+        return f"Scholarship(№{self.number}, {self.student_name}, {self.amount})"
 
     def __str__(self) -> str:
         """Пользовательское строковое представление."""
-        return f"{self._number:<3} {self._date:<12} {self._student_name:<25} {self._amount:<10} {self._destination}"
+        return f"{self.number:<3} {self.date:<12} {self.student_name:<25} {self.amount:<10} {self.destination}"
 
     # Свойства для доступа к полям
     @property
@@ -90,115 +120,855 @@ class HighScholarship(Scholarship):
         return f"HighScholarship(№{self._number}, {self._student_name}, {self.total_amount})"
 
 
+class ScholarshipView:
+    """Легковесное представление строки коллекции: поля читаются из колонок по индексу.
+
+    Представление не копирует данные и указывает на позицию в коллекции, поэтому
+    после удаления записей ранее полученные представления сдвигаются вместе
+    со строками. Для независимой копии есть to_scholarship().
+    """
+
+    __slots__ = ('_collection', '_index')
+
+    def __init__(self, collection: 'ScholarshipCollection', index: int):
+        self._collection = collection
+        self._index = index
+
+    @property
+    def number(self) -> int:
+        return self._collection._numbers[self._index]
+
+    @property
+    def date(self) -> str:
+        return self._collection._date_at(self._index)
+
+    @property
+    def student_name(self) -> str:
+        return self._collection._strings[self._collection._names[self._index]]
+
+    @property
+    def amount(self) -> float:
+        return self._collection._amounts[self._index]
+
+    @property
+    def destination(self) -> str:
+        return self._collection._strings[self._collection._destinations[self._index]]
+
+    __repr__ = Scholarship.__repr__
+    __str__ = Scholarship.__str__
+
+    def to_scholarship(self) -> Scholarship:
+        """Отдельный объект Scholarship с теми же полями."""
+        return Scholarship(self.number, self.date, self.student_name, self.amount, self.destination)
+
+
+class StringHeap:
+    """Строки снимка: байты UTF-8 подряд и таблица смещений; строка декодируется при обращении."""
+
+    __slots__ = ('_data', '_offsets')
+
+    def __init__(self, data: memoryview, offsets: memoryview):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return str(self._data[self._offsets[index]:self._offsets[index + 1]], 'utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+class SortedIndex:
+    """Вторичный индекс коллекции: ключи по возрастанию и позиции строк с этими ключами.
+
+    Равные ключи упорядочены по позиции строки, как при устойчивой сортировке.
+    После удаления строки позиции следующих сдвигаются; индекс пересчитывает
+    их не сразу, а одним проходом при следующем чтении, поэтому k удалений
+    подряд стоят O(k log n + n), а не O(n·k).
+    """
+
+    __slots__ = ('keys', '_rows', '_removed')
+
+    def __init__(self, keys, rows: array):
+        self.keys = keys
+        self._rows = rows
+        # Удаленные позиции в нумерации _rows (до пересчета), по возрастанию
+        self._removed: List[int] = []
+
+    @classmethod
+    def build(cls, key_of_row, count: int, keys_type=list) -> 'SortedIndex':
+        """Построение индекса одной сортировкой по ключам строк 0..count-1."""
+        order = sorted(range(count), key=key_of_row)
+        return cls(keys_type(map(key_of_row, order)), array('q', order))
+
+    @property
+    def rows(self) -> array:
+        """Позиции строк в порядке ключей (с учетом удалений)."""
+        if self._removed:
+            removed = self._removed
+            self._rows = array('q', [row - bisect_left(removed, row) for row in self._rows])
+            self._removed = []
+        return self._rows
+
+    def _stored(self, row: int) -> int:
+        """Позиция строки row в нумерации _rows: row плюс число удаленных перед ней."""
+        stored = row
+        while True:
+            shifted = row + bisect_right(self._removed, stored)
+            if shifted == stored:
+                return stored
+            stored = shifted
+
+    def insert(self, key, row: int):
+        """Добавление строки; row должна быть больше всех позиций в индексе."""
+        position = bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self._rows.insert(position, row + len(self._removed))
+
+    def remove(self, key, row: int):
+        """Удаление строки с позицией row; позиции после нее сдвигаются на единицу."""
+        stored = self._stored(row)
+        position = bisect_left(self.keys, key)
+        while self._rows[position] != stored:
+            position += 1
+        del self.keys[position]
+        del self._rows[position]
+        insort(self._removed, stored)
+
+    def between(self, low=None, high=None, include_low: bool = True, include_high: bool = True) -> array:
+        """Позиции строк с ключами в диапазоне (в порядке ключей), за O(log n + k)."""
+        start = 0
+        stop = len(self.keys)
+        if low is not None:
+            start = (bisect_left if include_low else bisect_right)(self.keys, low)
+        if high is not None:
+            stop = (bisect_right if include_high else bisect_left)(self.keys, high)
+        return self.rows[start:max(start, stop)]
+
+    def descending(self) -> Iterator[int]:
+        """Позиции строк по убыванию ключа; равные ключи - по возрастанию позиции."""
+        rows, keys = self.rows, self.keys
+        end = len(keys)
+        while end:
+            start = bisect_left(keys, keys[end - 1], 0, end)
+            yield from rows[start:end]
+            end = start
+
+
+class Descending:
+    """Обертка ключа с обратным порядком сравнения (для кучи по убыванию)."""
+
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other: 'Descending') -> bool:
+        return other.key < self.key
+
+    def __eq__(self, other: 'Descending') -> bool:
+        return self.key == other.key
+
+
+def amount_key(scholarship) -> float:
+    return scholarship.amount
+
+
 class ScholarshipCollection:
-    """Класс для работы с коллекцией справок о стипендиях."""
+    """Класс для работы с коллекцией справок о стипендиях.
+
+    Записи хранятся по колонкам: номера и суммы - в массивах array, даты - как
+    порядковые номера дней, строки - индексами в общем пуле, где каждая
+    различная строка хранится один раз. Доступ к записям идет через
+    ScholarshipView.
+
+    Индексы по ФИО (без учета регистра) и по сумме строятся при первом запросе
+    и дальше поддерживаются при добавлении и удалении записей.
+
+    Коллекция, открытая из снимка (load_snapshot), читает колонки прямо из
+    отображенного в память файла и копирует их в массивы только при первом
+    изменении.
+    """
 
     def __init__(self):
-        self._scholarships: List[Scholarship] = []
+        self._numbers = array('q')
+        self._amounts = array('d')
+        # Порядковый номер дня (date.toordinal) или -(индекс в пуле + 1) для дат
+        # не в формате YYYY-MM-DD: они хранятся строкой как есть
+        self._dates = array('i')
+        self._names = array('I')
+        self._destinations = array('I')
+        self._strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self._name_keys: Dict[int, str] = {}
+        self._by_name: Optional[SortedIndex] = None
+        self._by_amount: Optional[SortedIndex] = None
+        # (абсолютный путь файла, сколько первых строк коллекции в нем уже записано,
+        # размер файла после последней записи)
+        self._persisted: Optional[Tuple[str, int, int]] = None
+        # Отображение файла снимка, из которого читаются колонки (None - колонки в массивах)
+        self._mapping: Optional[mmap.mmap] = None
+        # (размер, mtime_ns) CSV, из которого сделан открытый снимок
+        self._source: Optional[Tuple[int, int]] = None
+        # Счетчик изменений: генераторы по индексам проверяют, что коллекция не менялась
+        self._modifications = 0
+
+    def _make_writable(self):
+        """Копирование колонок снимка в массивы перед первым изменением."""
+        if self._mapping is None:
+            return
+        for name, typecode in SNAPSHOT_COLUMNS:
+            column = array(typecode)
+            column.frombytes(getattr(self, name).cast('B'))
+            setattr(self, name, column)
+        self._strings = list(self._strings)
+        self._string_ids = {text: string_id for string_id, text in enumerate(self._strings)}
+        self._mapping = None
+
+    def _intern(self, text: str) -> int:
+        """Индекс строки в пуле (строка добавляется при первой встрече)."""
+        string_id = self._string_ids.get(text)
+        if string_id is None:
+            string_id = self._string_ids[text] = len(self._strings)
+            self._strings.append(text)
+        return string_id
+
+    def _pack_date(self, date_str: str) -> int:
+        """Упаковка даты в целое для колонки _dates."""
+        try:
+            ordinal = date.fromisoformat(date_str).toordinal()
+        except ValueError:
+            return -self._intern(date_str) - 1
+        if date.fromordinal(ordinal).isoformat() != date_str:
+            # fromisoformat принимает и другие записи ISO 8601 (20240115) - их храним как есть
+            return -self._intern(date_str) - 1
+        return ordinal
+
+    def _name_key(self, index: int) -> str:
+        """Ключ сортировки по ФИО строки index (casefold считается один раз на строку пула)."""
+        string_id = self._names[index]
+        key = self._name_keys.get(string_id)
+        if key is None:
+            key = self._name_keys[string_id] = self._strings[string_id].casefold()
+        return key
+
+    def _name_index(self) -> SortedIndex:
+        if self._by_name is None:
+            self._by_name = SortedIndex.build(self._name_key, len(self))
+        return self._by_name
+
+    def _amount_index(self) -> SortedIndex:
+        if self._by_amount is None:
+            self._by_amount = SortedIndex.build(self._amounts.__getitem__, len(self),
+                                                lambda keys: array('d', keys))
+        return self._by_amount
 
-    def __iter__(self) -> Iterator[Scholarship]:
+    def _date_at(self, index: int) -> str:
+        packed = self._dates[index]
+        if packed > 0:
+            return date.fromordinal(packed).isoformat()
+        return self._strings[-packed - 1]
+
+    def _extend(self, other: 'ScholarshipCollection'):
+        """Добавление всех строк другой коллекции (пулы строк объединяются)."""
+        self._make_writable()
+        remap = [self._intern(text) for text in other._strings]
+        start = len(self)
+        self._numbers.extend(other._numbers)
+        self._amounts.extend(other._amounts)
+        if not other._dates or min(other._dates) > 0:
+            self._dates.extend(other._dates)
+        else:
+            self._dates.extend(packed if packed > 0 else -remap[-packed - 1] - 1 for packed in other._dates)
+        self._names.extend(map(remap.__getitem__, other._names))
+        self._destinations.extend(map(remap.__getitem__, other._destinations))
+        self._modifications += 1
+        for index in range(start, len(self)):
+            if self._by_name is not None:
+                self._by_name.insert(self._name_key(index), index)
+            if self._by_amount is not None:
+                self._by_amount.insert(self._amounts[index], index)
+
+    def _append(self, number: int, date_str: str, student_name: str, amount: float, destination: str):
+        """Добавление строки в колонки (типы полей уже проверены)."""
+        self._make_writable()
+        try:
+            self._numbers.append(number)
+        except OverflowError:
+            raise ValueError("Номер не помещается в 64 бита")
+        self._amounts.append(amount)
+        self._dates.append(self._pack_date(date_str))
+        self._names.append(self._intern(student_name))
+        self._destinations.append(self._intern(destination))
+        self._modifications += 1
+        index = len(self._numbers) - 1
+        if self._by_name is not None:
+            self._by_name.insert(self._name_key(index), index)
+        if self._by_amount is not None:
+            self._by_amount.insert(amount, index)
+
+    def __iter__(self) -> Iterator[ScholarshipView]:
         """Итератор для коллекции."""
-        return iter(self._scholarships)
+        for index in range(len(self._numbers)):
+            yield ScholarshipView(self, index)
 
-    def __getitem__(self, index: int) -> Scholarship:
-        """Доступ к элементам по индексу."""
-        return self._scholarships[index]
+    def __getitem__(self, index):
+        """Доступ к элементам по индексу (или срезу)."""
+        if isinstance(index, slice):
+            return [ScholarshipView(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self._numbers)
+        if not 0 <= index < len(self._numbers):
+            raise IndexError("Индекс за пределами коллекции")
+        return ScholarshipView(self, index)
 
     def __len__(self) -> int:
         """Длина коллекции."""
-        return len(self._scholarships)
+        return len(self._numbers)
 
     def __repr__(self) -> str:
         """Строковое представление коллекции."""
-        return f"ScholarshipCollection({len(self._scholarships)} items)"
+        return f"ScholarshipCollection({len(self)} items)"
 
     def add_scholarship(self, scholarship: Scholarship):
-        """Добавление справки в коллекцию."""
-        self._scholarships.append(scholarship)
+        """Добавление справки в коллекцию (поля копируются в колонки)."""
+        self._append(scholarship.number, scholarship.date, scholarship.student_name,
+                     scholarship.amount, scholarship.destination)
 
     def remove_scholarship(self, index: int):
         """Удаление справки по индексу."""
-        if 0 <= index < len(self._scholarships):
-            del self._scholarships[index]
+        if 0 <= index < len(self):
+            self._make_writable()
+            if self._by_name is not None:
+                self._by_name.remove(self._name_key(index), index)
+            if self._by_amount is not None:
+                self._by_amount.remove(self._amounts[index], index)
+            # Строки остаются в пуле: их могут использовать другие записи
+            for column in (self._numbers, self._amounts, self._dates, self._names, self._destinations):
+                del column[index]
+            self._modifications += 1
+            if self._persisted is not None and index < self._persisted[1]:
+                # Удаленная строка уже в файле: дописыванием это не сохранить
+                self._persisted = None
+
+    def _views(self, rows):
+        """Представления строк по позициям; как и у dict, изменение коллекции во время обхода - ошибка."""
+        modifications = self._modifications
+        for index in rows:
+            if self._modifications != modifications:
+                raise RuntimeError("Коллекция изменилась во время обхода")
+            yield ScholarshipView(self, index)
 
     def filter_by_amount(self, min_amount: float):
-        """Генератор для фильтрации по размеру стипендии."""
-        for scholarship in self._scholarships:
-            if scholarship.amount > min_amount:
-                yield scholarship
+        """Генератор для фильтрации по размеру стипендии (в порядке коллекции)."""
+        rows = self._amount_index().between(min_amount, include_low=False)
+        return self._views(sorted(rows))
+
+    def filter_by_amount_range(self, min_amount: float = None, max_amount: float = None):
+        """Генератор справок с суммой от min_amount до max_amount включительно (в порядке сумм)."""
+        return self._views(self._amount_index().between(min_amount, max_amount))
 
-    def sort_by_name_generator(self):
+    def sort_by_name_generator(self, reverse: bool = False):
         """Генератор для сортировки по имени."""
-        sorted_scholarships = sorted(self._scholarships, key=lambda x: x.student_name.lower())
-        for scholarship in sorted_scholarships:
-            yield scholarship
+        index = self._name_index()
+        return self._views(index.descending() if reverse else index.rows)
 
-    def sort_by_amount_generator(self):
+    def sort_by_amount_generator(self, reverse: bool = False):
         """Генератор для сортировки по размеру стипендии."""
-        sorted_scholarships = sorted(self._scholarships, key=lambda x: x.amount)
-        for scholarship in sorted_scholarships:
-            yield scholarship
+        index = self._amount_index()
+        return self._views(index.descending() if reverse else index.rows)
+
+    def lazy_sorted_generator(self, key: Callable[[ScholarshipView], Any], reverse: bool = False):
+        """Генератор справок по произвольному ключу с ленивой сортировкой.
+
+        Куча строится один раз за O(n), каждая следующая справка извлекается за
+        O(log n), поэтому первые k справок стоят O(n + k log n). Порядок равных
+        ключей - как у sorted().
+        """
+        wrap = Descending if reverse else None
+        heap = [(wrap(key(view)) if wrap else key(view), view._index) for view in self]
+        heapify(heap)
+        while heap:
+            yield ScholarshipView(self, heappop(heap)[1])
+
+    def top_k(self, k: int, key: Callable[[ScholarshipView], Any] = amount_key) -> List[ScholarshipView]:
+        """k справок с наибольшим ключом (по умолчанию - размером стипендии), за O(n log k)."""
+        if key is amount_key:
+            # По сумме выбираем позиции прямо из колонки, не создавая представлений
+            return list(self._views(nlargest(k, range(len(self)), key=self._amounts.__getitem__)))
+        return nlargest(k, self, key=key)
+
+    def bottom_k(self, k: int, key: Callable[[ScholarshipView], Any] = amount_key) -> List[ScholarshipView]:
+        """k справок с наименьшим ключом (по умолчанию - размером стипендии), за O(n log k)."""
+        if key is amount_key:
+            return list(self._views(nsmallest(k, range(len(self)), key=self._amounts.__getitem__)))
+        return nsmallest(k, self, key=key)
 
     def get_high_scholarships_generator(self, threshold: float = 2000):
         """Генератор высоких стипендий."""
-        for scholarship in self._scholarships:
-            if scholarship.amount > threshold:
-                # Создаем объект высокой стипендии
-                yield HighScholarship(
-                    scholarship.number,
-                    scholarship.date,
-                    scholarship.student_name,
-                    scholarship.amount,
-                    scholarship.destination,
-                    scholarship.amount * 0.1  # 10% бонус
-                )
+        for scholarship in self.filter_by_amount(threshold):
+            # Создаем объект высокой стипендии
+            yield HighScholarship(
+                scholarship.number,
+                scholarship.date,
+                scholarship.student_name,
+                scholarship.amount,
+                scholarship.destination,
+                scholarship.amount * 0.1  # 10% бонус
+            )
+
+    @staticmethod
+    def iter_csv_rows(filename: str) -> Iterator[Tuple[int, str, str, float, str]]:
+        """Генератор строк CSV файла в виде кортежей (номер, дата, ФИО, сумма, куда выдается).
+
+        Файл читается построчно, в памяти находится одна запись.
+        """
+        with open(filename, encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            number, date_, name, amount, destination = csv_columns(header, filename)
+            for row in reader:
+                if row:
+                    yield int(row[number]), row[date_], row[name], float(row[amount]), row[destination]
+
+    @staticmethod
+    def iter_csv(filename: str) -> Iterator[Scholarship]:
+        """Генератор справок из CSV файла по одной."""
+        for row in ScholarshipCollection.iter_csv_rows(filename):
+            yield Scholarship(*row)
+
+    @staticmethod
+    def iter_csv_batches(filename: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator['ScholarshipCollection']:
+        """Генератор коллекций не больше batch_size справок из CSV файла."""
+        batch = ScholarshipCollection()
+        for row in ScholarshipCollection.iter_csv_rows(filename):
+            batch._append(*row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = ScholarshipCollection()
+        if len(batch):
+            yield batch
 
     @staticmethod
     def create_from_csv(filename: str) -> 'ScholarshipCollection':
         """Статический метод для создания коллекции из CSV файла."""
         collection = ScholarshipCollection()
         try:
-            with open(filename, encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    scholarship = Scholarship(
-                        int(row['№']),
-                        row['дата'],
-                        row['ФИО студента'],
-                        float(row['размер стипендии']),
-                        row['куда выдается справка']
-                    )
-                    collection.add_scholarship(scholarship)
+            # Типы полей гарантирует разбор, промежуточный Scholarship не нужен
+            for row in ScholarshipCollection.iter_csv_rows(filename):
+                collection._append(*row)
         except FileNotFoundError:
             print(f"Файл {filename} не найден")
+        else:
+            collection._persisted = (os.path.abspath(filename), len(collection), os.path.getsize(filename))
         return collection
 
+    @staticmethod
+    def create_from_csv_parallel(filename: str, processes: Optional[int] = None,
+                                 chunk_size: int = PARALLEL_CHUNK_SIZE
+                                 ) -> Tuple['ScholarshipCollection', List[Tuple[int, str]]]:
+        """Загрузка CSV файла в несколько процессов.
+
+        Файл делится на куски по границам строк, куски разбираются в пуле
+        процессов и объединяются в исходном порядке. Некорректные строки
+        пропускаются; возвращается (коллекция, [(номер строки файла, ошибка), ...]).
+        """
+        collection = ScholarshipCollection()
+        errors: List[Tuple[int, str]] = []
+        with open(filename, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return collection, errors
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                header_end = data.find(b'\n') + 1 or len(data)
+                header = next(csv.reader([data[:header_end].decode('utf-8-sig')]), [])
+                columns = csv_columns(header, filename)
+                bounds = csv_chunk_bounds(data, header_end, chunk_size)
+
+        chunks = [(filename, start, end, columns) for start, end in zip(bounds, bounds[1:])]
+        if len(chunks) <= 1 or processes == 1:
+            results = map(parse_csv_chunk, chunks)
+            return ScholarshipCollection._merge_chunks(results, collection, errors)
+        with ProcessPoolExecutor(processes) as pool:
+            results = pool.map(parse_csv_chunk, chunks)
+            return ScholarshipCollection._merge_chunks(results, collection, errors)
+
+    @staticmethod
+    def _merge_chunks(results, collection, errors):
+        first_line = 2  # строка 1 - заголовок
+        for part, part_errors, line_count in results:
+            collection._extend(part)
+            errors.extend((first_line + line - 1, message) for line, message in part_errors)
+            first_line += line_count
+        return collection, errors
+
+    def _csv_rows(self, start: int = 0):
+        for scholarship in self._views(range(start, len(self))):
+            yield (scholarship.number, scholarship.date, scholarship.student_name,
+                   scholarship.amount, scholarship.destination)
+
     def save_to_csv(self, filename: str):
-        """Сохранение коллекции в CSV файл."""
-        with open(filename, 'w', newline='', encoding='utf-8') as f:
-            fieldnames = ['№', 'дата', 'ФИО студента', 'размер стипендии', 'куда выдается справка']
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for scholarship in self._scholarships:
-                writer.writerow({
-                    '№': scholarship.number,
-                    'дата': scholarship.date,
-                    'ФИО студента': scholarship.student_name,
-                    'размер стипендии': scholarship.amount,
-                    'куда выдается справка': scholarship.destination
-                })
+        """Сохранение коллекции в CSV файл (полная перезапись через временный файл).
+
+        При сбое во время записи на месте остается прежняя версия файла.
+        """
+        write_csv_atomic(filename, self._csv_rows())
+        self._persisted = (os.path.abspath(filename), len(self), os.path.getsize(filename))
+
+    def save_incremental(self, filename: str) -> int:
+        """Сохранение только новых справок дописыванием в конец CSV файла.
+
+        Если коллекция загружалась не из этого файла, в ней удалялись уже
+        записанные строки или файл стал короче, чем после последней записи,
+        файл перезаписывается целиком (save_to_csv). Байты сверх известного
+        размера - хвост оборванного дописывания, он отрезается.
+        Возвращает число записанных справок.
+        """
+        path = os.path.abspath(filename)
+        if (self._persisted is None or self._persisted[0] != path or not os.path.exists(path)
+                or os.path.getsize(path) < self._persisted[2]):
+            self.save_to_csv(filename)
+            return len(self)
+        _, start, size = self._persisted
+        if start < len(self):
+            size = append_csv_rows(filename, self._csv_rows(start), expected_size=size)
+        self._persisted = (path, len(self), size)
+        return len(self) - start
+
+    def save_snapshot(self, filename: str, source: Optional[Tuple[int, int]] = None):
+        """Сохранение коллекции в двоичный снимок (атомарно, через временный файл).
+
+        source - csv_stamp CSV файла, точной копией которого является коллекция.
+        """
+        encoded = [text.encode('utf-8') for text in self._strings]
+        offsets = array('Q', [0])
+        total = 0
+        for data in encoded:
+            total += len(data)
+            offsets.append(total)
+        header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, sys.byteorder == 'big', 0,
+                                      len(self), len(encoded), *(source or (0, 0)))
+        with atomic_file(filename, 'wb') as f:
+            f.write(header)
+            for column in [getattr(self, name) for name, _ in SNAPSHOT_COLUMNS] + [offsets]:
+                f.write(b'\0' * (-f.tell() % 8))
+                f.write(column)
+            f.write(b''.join(encoded))
+
+    def to_columns(self) -> Dict[str, list]:
+        """Колонки коллекции списками Python {поле CSV: значения}; каждая строка пула декодируется один раз."""
+        strings = list(self._strings)
+        dates: Dict[int, str] = {}
+
+        def unpack_date(packed: int) -> str:
+            text = dates.get(packed)
+            if text is None:
+                text = dates[packed] = date.fromordinal(packed).isoformat() if packed > 0 else strings[-packed - 1]
+            return text
+
+        return {
+            '№': self._numbers.tolist(),
+            'дата': list(map(unpack_date, self._dates)),
+            'ФИО студента': list(map(strings.__getitem__, self._names)),
+            'размер стипендии': self._amounts.tolist(),
+            'куда выдается справка': list(map(strings.__getitem__, self._destinations)),
+        }
+
+    @staticmethod
+    def load_snapshot(filename: str) -> 'ScholarshipCollection':
+        """Открытие двоичного снимка через mmap без разбора записей.
+
+        Записи декодируются при обращении, поэтому открытие не зависит от
+        размера снимка.
+        """
+        with open(filename, 'rb') as f:
+            try:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError(f"{filename}: пустой файл, а не снимок коллекции")
+        data = memoryview(mapping)
+        if len(data) < SNAPSHOT_HEADER_V1.size:
+            raise ValueError(f"{filename}: не снимок коллекции")
+        magic, version, big_endian, _, count, string_count = SNAPSHOT_HEADER_V1.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version not in (1, SNAPSHOT_VERSION):
+            raise ValueError(f"{filename}: не снимок коллекции или неподдерживаемая версия")
+        source = None
+        offset = SNAPSHOT_HEADER_V1.size
+        if version == SNAPSHOT_VERSION:
+            if len(data) < SNAPSHOT_HEADER.size:
+                raise ValueError(f"{filename}: снимок обрезан")
+            source_size, source_mtime = SNAPSHOT_HEADER.unpack_from(data)[6:]
+            if source_size or source_mtime:
+                source = (source_size, source_mtime)
+            offset = SNAPSHOT_HEADER.size
+        if bool(big_endian) != (sys.byteorder == 'big'):
+            raise ValueError(f"{filename}: снимок записан на машине с другим порядком байтов")
+
+        collection = ScholarshipCollection()
+        collection._source = source
+        columns = [(name, typecode, count) for name, typecode in SNAPSHOT_COLUMNS]
+        columns.append(('offsets', 'Q', string_count + 1))
+        values = {}
+        for name, typecode, length in columns:
+            offset += -offset % 8
+            size = length * array(typecode).itemsize
+            if offset + size > len(data):
+                raise ValueError(f"{filename}: снимок обрезан")
+            values[name] = data[offset:offset + size].cast(typecode)
+            offset += size
+        offsets = values.pop('offsets')
+        if offset + offsets[-1] > len(data):
+            raise ValueError(f"{filename}: снимок обрезан")
+        for name, column in values.items():
+            setattr(collection, name, column)
+        collection._strings = StringHeap(data[offset:], offsets)
+        collection._string_ids = None
+        collection._mapping = mapping
+        return collection
 
     def print_collection(self):
         """Вывод коллекции в табличном виде."""
         print(f"{'№':<3} {'Дата':<12} {'ФИО студента':<25} {'Стипендия':<10} {'Куда выдается'}")
         print('-' * 70)
-        for scholarship in self._scholarships:
+        for scholarship in self:
             print(scholarship)
 
 
+def fsync_directory(directory: str):
+    """Сброс на диск записи каталога (нужен, чтобы переименование пережило сбой питания)."""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def file_mode(path: str) -> int:
+    """Права для новой версии файла: как у текущей, а для нового файла - по umask."""
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+@contextmanager
+def atomic_file(filename: str, mode: str = 'w', **open_args):
+    """Файл для полной перезаписи filename: пишется во временный файл рядом и
+    атомарно заменяет filename только после успешной записи и fsync."""
+    path = os.path.abspath(filename)
+    directory = os.path.dirname(path)
+    fd, temp_name = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, **open_args) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_name, file_mode(path))
+        os.replace(temp_name, path)
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.unlink(temp_name)
+        raise
+    fsync_directory(directory)
+
+
+def write_csv_atomic(filename: str, rows):
+    """Запись CSV файла с заголовком во временный файл и атомарная замена им filename."""
+    with atomic_file(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        writer.writerows(rows)
+
+
+def snapshot_filename(csv_filename: str) -> str:
+    """Имя снимка рядом с CSV файлом: data.csv -> data.snap."""
+    return os.path.splitext(csv_filename)[0] + '.snap'
+
+
+def csv_stamp(csv_filename: str) -> Tuple[int, int]:
+    """Размер и mtime_ns файла: по ним снимок сверяется со своим CSV."""
+    stat = os.stat(csv_filename)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def csv_to_snapshot(csv_filename: str, snapshot: Optional[str] = None) -> ScholarshipCollection:
+    """Конвертация CSV в двоичный снимок."""
+    # До чтения: если CSV изменится во время разбора, снимок не совпадет с ним
+    stamp = csv_stamp(csv_filename)
+    collection = ScholarshipCollection.create_from_csv(csv_filename)
+    collection.save_snapshot(snapshot or snapshot_filename(csv_filename), stamp)
+    return collection
+
+
+def snapshot_to_csv(snapshot: str, csv_filename: str) -> ScholarshipCollection:
+    """Конвертация двоичного снимка в CSV."""
+    collection = ScholarshipCollection.load_snapshot(snapshot)
+    collection.save_to_csv(csv_filename)
+    return collection
+
+
+def matching_snapshot(csv_filename: str) -> Optional[ScholarshipCollection]:
+    """Снимок рядом с CSV, если он сделан из CSV с тем же размером и mtime_ns, иначе None.
+
+    Время изменения сравнивается на равенство, а не «снимок новее»: CSV,
+    замененный файлом с более старым mtime (cp -p, git checkout, восстановление
+    из резервной копии), иначе читался бы из устаревшего снимка.
+    """
+    try:
+        stamp = csv_stamp(csv_filename)
+        collection = ScholarshipCollection.load_snapshot(snapshot_filename(csv_filename))
+    except (OSError, ValueError):
+        return None
+    if collection._source != stamp:
+        return None
+    # Снимок сделан из этого CSV, поэтому новые справки можно дописывать в него
+    collection._persisted = (os.path.abspath(csv_filename), len(collection), stamp[0])
+    return collection
+
+
+def load_collection(csv_filename: str) -> ScholarshipCollection:
+    """Коллекция из снимка рядом с CSV, если он сделан из этой версии CSV, иначе - разбором CSV."""
+    collection = matching_snapshot(csv_filename)
+    if collection is None:
+        collection = ScholarshipCollection.create_from_csv(csv_filename)
+    return collection
+
+
+def last_line_start(f, size: int) -> int:
+    """Смещение начала последней строки файла (читается с конца блоками)."""
+    end = size
+    while end > 0:
+        start = max(0, end - 65536)
+        f.seek(start)
+        newline = f.read(end - start).rfind(b'\n')
+        if newline != -1:
+            return start + newline + 1
+        end = start
+    return 0
+
+
+def append_csv_rows(filename: str, rows, expected_size: Optional[int] = None) -> int:
+    """Дописывание строк в конец CSV файла с fsync; возвращает новый размер файла.
+
+    expected_size - размер файла после последней известной записи: все, что
+    за ним, - хвост оборванного дописывания, и он отрезается. Последняя
+    строка без перевода строки в пределах expected_size (так часто кончаются
+    выгрузки и файлы, правленные вручную) сохраняется и дополняется
+    переводом строки. Без expected_size такая строка считается хвостом
+    оборванного дописывания и отрезается: по ее содержимому это не
+    определить (обрыв внутри суммы или названия дает правдоподобную запись).
+    """
+    with open(filename, 'r+b') as f:
+        size = f.seek(0, os.SEEK_END)
+        if expected_size is not None and size > expected_size:
+            f.truncate(expected_size)
+            size = expected_size
+        if size:
+            f.seek(size - 1)
+            if f.read(1) != b'\n':
+                if expected_size is None:
+                    size = last_line_start(f, size)
+                    f.truncate(size)
+                else:
+                    f.seek(size)
+                    f.write(b'\n')
+                    size += 1
+        f.seek(size)
+        text = io.StringIO(newline='')
+        writer = csv.writer(text)
+        if not size:
+            writer.writerow(CSV_FIELDS)
+        writer.writerows(rows)
+        f.write(text.getvalue().encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def csv_columns(header: List[str], filename: str) -> List[int]:
+    """Позиции колонок CSV_FIELDS в заголовке файла."""
+    try:
+        return [header.index(field) for field in CSV_FIELDS]
+    except ValueError:
+        raise ValueError(f"В заголовке {filename} нет нужных колонок: {', '.join(CSV_FIELDS)}")
+
+
+def csv_chunk_bounds(data, start: int, chunk_size: int) -> List[int]:
+    """Смещения кусков файла примерно по chunk_size байт, начиная со start.
+
+    Граница ставится после перевода строки и только вне кавычек: поле в
+    кавычках может содержать перевод строки, поэтому кусок должен содержать
+    четное число кавычек.
+    """
+    bounds = [start]
+    size = len(data)
+    while bounds[-1] < size:
+        begin = bounds[-1]
+        end = begin + chunk_size
+        while True:
+            newline = data.find(b'\n', end) if end < size else -1
+            if newline == -1:
+                end = size
+                break
+            end = newline + 1
+            if data[begin:end].count(b'"') % 2 == 0:
+                break
+        bounds.append(end)
+    return bounds
+
+
+def parse_csv_chunk(task) -> Tuple[ScholarshipCollection, List[Tuple[int, str]], int]:
+    """Разбор куска CSV файла в рабочем процессе.
+
+    Возвращает коллекцию, ошибки с номерами строк внутри куска (с 1) и число
+    строк в куске.
+    """
+    filename, start, end, (number, date_, name, amount, destination) = task
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+    collection = ScholarshipCollection()
+    errors = []
+    reader = csv.reader(io.StringIO(text, newline=''))
+    line = 1
+    for row in reader:
+        if row:
+            try:
+                collection._append(int(row[number]), row[date_], row[name], float(row[amount]), row[destination])
+            except (ValueError, IndexError) as e:
+                errors.append((line, str(e) if not isinstance(e, IndexError) else "Не хватает колонок"))
+        line = reader.line_num + 1
+    line_count = text.count('\n') + (0 if not text or text.endswith('\n') else 1)
+    return collection, errors, line_count
+
+
 def main():
-    # Создаем коллекцию из CSV файла
-    collection = ScholarshipCollection.create_from_csv(FILENAME)
+    parser = argparse.ArgumentParser(description="Справки о стипендиях: демонстрация и конвертация снимков")
+    parser.add_argument('--to-snapshot', nargs=2, metavar=('CSV', 'SNAPSHOT'),
+                        help="сохранить CSV файл в двоичный снимок")
+    parser.add_argument('--to-csv', nargs=2, metavar=('SNAPSHOT', 'CSV'),
+                        help="сохранить двоичный снимок в CSV файл")
+    args = parser.parse_args()
+    if args.to_snapshot:
+        collection = csv_to_snapshot(*args.to_snapshot)
+        print(f"Снимок {args.to_snapshot[1]}: {len(collection)} справок")
+        return
+    if args.to_csv:
+        collection = snapshot_to_csv(*args.to_csv)
+        print(f"CSV {args.to_csv[1]}: {len(collection)} справок")
+        return
+
+    # Создаем коллекцию из снимка data.snap, если он актуален, иначе из CSV файла
+    collection = load_collection(FILENAME)
 
     print("Исходные данные:")
     collection.print_collection()
@@ -258,8 +1028,8 @@ def main():
     except ValueError as e:
         print(f"Ошибка при создании записи: {e}")
 
-    # Сохранение данных
-    collection.save_to_csv(FILENAME)
+    # Сохранение данных: новые справки дописываются в конец файла
+    collection.save_incremental(FILENAME)
     print(f"\nДанные сохранены в файл {FILENAME}")
 
 
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""Массовая загрузка справок из CSV (формат data.csv) в scholarships.db.
+
+Файл читается потоково, студенты ищутся по ФИО в словаре, загруженном одним
+запросом, а справки вставляются одним подготовленным INSERT (его SQL строит
+insert_many) через executemany внутри транзакций по chunk_size строк. Студенты, которых нет в базе, создаются на указанном
+факультете.
+
+С --bulk справки загружаются без построчного обновления сводки,
+полнотекстового индекса и вторичных индексов: они удаляются и после вставки
+перестраиваются по всей таблице. Это быстрее только при загрузке, сравнимой
+с объемом таблицы, и требует монопольного доступа к базе (сервер должен быть
+остановлен); весь импорт идет одной транзакцией.
+
+    python import_csv.py data.csv --chunk-size 50000
+"""
+import argparse
+import csv
+import sys
+import time
+from contextlib import nullcontext
+from datetime import date, datetime
+
+from peewee import fn
+
+from models import (db, configure_database, create_tables, bulk_load_scholarships,
+                    ExclusiveAccessError, Department, Student, Scholarship)
+
+FIELDNAMES = ['№', 'дата', 'ФИО студента', 'размер стипендии', 'куда выдается справка']
+
+DEFAULT_CHUNK_SIZE = 50000
+# Новых студентов на один insert_many (6 столбцов, в пределах лимита переменных SQLite)
+STUDENT_BATCH_SIZE = 500
+
+
+def parse_row(row):
+    """Преобразует строку CSV в поля Scholarship (ValueError при некорректных данных)"""
+    date_str = row['дата']
+    if len(date_str) != 10:
+        raise ValueError(f"некорректная дата {date_str!r}")
+    date.fromisoformat(date_str)
+    return {
+        'number': int(row['№']),
+        'date': date_str,
+        'student_name': row['ФИО студента'],
+        'amount': float(row['размер стипендии']),
+        'destination': row['куда выдается справка'],
+    }
+
+
+class StudentLookup:
+    """Словарь ФИО -> id студента; недостающие студенты создаются пачкой"""
+
+    def __init__(self, department):
+        self.department = department
+        self.ids = {}
+        for student_pk, full_name in Student.select(Student.id, Student.full_name).tuples().iterator():
+            self.ids.setdefault(full_name, student_pk)
+
+    def resolve(self, names):
+        """Создает отсутствующих студентов (в текущей транзакции) и возвращает словарь"""
+        missing = {name for name in names if name not in self.ids}
+        if missing:
+            next_id = (Student.select(fn.MAX(Student.id)).scalar() or 0) + 1
+            rows = []
+            for name in sorted(missing):
+                rows.append({
+                    'id': next_id,
+                    'full_name': name,
+                    'student_id': f'csv-{next_id}',
+                    'department': self.department,
+                    'created_at': datetime.now(),
+                })
+                self.ids[name] = next_id
+                next_id += 1
+            for i in range(0, len(rows), STUDENT_BATCH_SIZE):
+                Student.insert_many(rows[i:i + STUDENT_BATCH_SIZE]).execute()
+        return self.ids
+
+
+def insert_statement(replace):
+    """SQL вставки справки; peewee генерирует его один раз на весь импорт"""
+    fields = [Scholarship.number, Scholarship.date, Scholarship.student,
+              Scholarship.amount, Scholarship.destination, Scholarship.created_at]
+    query = Scholarship.insert_many([(0, '', 0, 0, '', '')], fields=fields)
+    if replace:
+        # UPSERT вместо REPLACE: id справки сохраняется, а триггеры счетчиков
+        # видят смену студента как UPDATE
+        query = query.on_conflict(conflict_target=[Scholarship.number], preserve=fields[1:])
+    else:
+        query = query.on_conflict_ignore()
+    sql, _ = query.sql()
+    return sql
+
+
+def insert_chunk(records, lookup, sql):
+    """Записывает одну порцию справок в текущей транзакции; возвращает число вставленных"""
+    ids = lookup.resolve({record['student_name'] for record in records})
+    now = str(datetime.now())
+    rows = [(record['number'],
+             record['date'],
+             ids[record['student_name']],
+             record['amount'],
+             record['destination'],
+             now) for record in records]
+    # Разбор SQL один раз, строки привязываются в C-цикле executemany;
+    # rowcount не учитывает строки, измененные триггерами счетчиков
+    cursor = db.cursor()
+    cursor.executemany(sql, rows)
+    return cursor.rowcount
+
+
+def import_chunk(records, lookup, sql):
+    """Записывает одну порцию справок в отдельной транзакции; возвращает число вставленных"""
+    with db.atomic('IMMEDIATE'):
+        return insert_chunk(records, lookup, sql)
+
+
+def import_csv(filename, department, chunk_size=DEFAULT_CHUNK_SIZE, replace=False, bulk=False,
+               out=sys.stdout):
+    """Загружает CSV-файл; возвращает (прочитано строк, вставлено, ошибочных строк)"""
+    lookup = StudentLookup(department)
+    sql = insert_statement(replace)
+    total = inserted = invalid = 0
+    started = time.perf_counter()
+    records = []
+
+    def flush():
+        nonlocal inserted
+        # В режиме bulk порции идут в общей транзакции: точка сохранения на каждую
+        # порцию внутри длинной транзакции в разы замедляет вставку
+        inserted += (insert_chunk if bulk else import_chunk)(records, lookup, sql)
+        records.clear()
+        elapsed = time.perf_counter() - started
+        print(f"{total} строк прочитано, {inserted} вставлено, "
+              f"{total / elapsed:.0f} строк/с", file=out)
+
+    with bulk_load_scholarships() if bulk else nullcontext():
+        with open(filename, encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                total += 1
+                try:
+                    records.append(parse_row(row))
+                except (KeyError, TypeError, ValueError) as e:
+                    invalid += 1
+                    print(f"Строка {reader.line_num}: пропущена ({e})", file=sys.stderr)
+                    continue
+                if len(records) >= chunk_size:
+                    flush()
+        if records:
+            flush()
+        if bulk:
+            print("Перестройка индексов, полнотекстового поиска и сводки...", file=out)
+
+    elapsed = time.perf_counter() - started
+    print(f"Готово: {total} строк за {elapsed:.2f} с ({total / elapsed if elapsed else 0:.0f} строк/с), "
+          f"вставлено {inserted}, пропущено с ошибками {invalid}", file=out)
+    return total, inserted, invalid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовый импорт справок из CSV в базу данных")
+    parser.add_argument('filename', help="CSV-файл в формате data.csv")
+    parser.add_argument('--database', help="файл базы данных (по умолчанию scholarships.db)")
+    parser.add_argument('--department-code', default='ИМП',
+                        help="код факультета для новых студентов")
+    parser.add_argument('--department-name', default='Импортированные студенты',
+                        help="название факультета, если его еще нет")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="строк на транзакцию")
+    parser.add_argument('--replace', action='store_true',
+                        help="заменять справки с существующими номерами (по умолчанию пропускать)")
+    parser.add_argument('--bulk', action='store_true',
+                        help="загружать без построчных триггеров и индексов и перестроить их по всей "
+                             "таблице в конце; нужен монопольный доступ к базе (остановите сервер)")
+    args = parser.parse_args()
+
+    if args.database:
+        configure_database(args.database)
+    create_tables()
+    department, created = Department.get_or_create(
+        code=args.department_code,
+        defaults={'name': args.department_name}
+    )
+    try:
+        import_csv(args.filename, department, args.chunk_size, args.replace, args.bulk)
+    except ExclusiveAccessError as e:
+        raise SystemExit(f"База открыта другим процессом, импорт --bulk невозможен: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""Метрики запросов CherryPy и выполняемого ими SQL.
+
+Инструмент cherrypy.tools.metrics для каждого обработчика собирает
+гистограммы времени ответа, размера ответа, числа SQL-запросов и их
+суммарного времени. Запросы считаются оберткой db.execute_sql, которая
+учитывает только запросы рабочего потока с активным HTTP-запросом. Время
+SQL-запроса - это выполнение до первой строки; чтение остальных строк
+курсора (и потоковая отправка ответа) входит только во время HTTP-запроса.
+Метрики отдаются страницей /metrics в текстовом формате Prometheus, только
+если это разрешено настройкой tools.metrics.expose (иначе страница отвечает
+404: по ней видны маршруты и нагрузка приложения).
+
+С параметром slow_threshold (секунды) запросы дольше порога пишутся в
+журнал ошибок CherryPy вместе с самыми медленными SQL-запросами и их
+EXPLAIN QUERY PLAN. Параметры SQL-запросов (ФИО, номера, суммы) в журнал
+не пишутся, только их число:
+
+    cherrypy.config.update({'tools.metrics.on': True, 'tools.metrics.slow_threshold': 0.5,
+                            'tools.metrics.expose': True})
+"""
+import logging
+import threading
+import time
+
+import cherrypy
+
+from models import db
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METRIC_PREFIX = 'scholarships_'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+# Сколько SQL-запросов одного HTTP-запроса хранить для журнала медленных запросов
+MAX_RECORDED_QUERIES = 1000
+# Сколько самых медленных SQL-запросов попадает в журнал вместе с планом
+SLOW_LOG_QUERIES = 5
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин (как histogram в Prometheus)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Пары (граница, число наблюдений не больше нее), последняя - +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+def format_labels(labels):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+class MetricsRegistry:
+    """Счетчики и гистограммы по обработчикам; обновляются из всех рабочих потоков"""
+
+    HISTOGRAMS = (
+        ('http_request_duration_seconds', "Время обработки HTTP-запроса", LATENCY_BUCKETS),
+        ('http_response_size_bytes', "Размер тела HTTP-ответа", SIZE_BUCKETS),
+        ('sql_queries_per_request', "Число SQL-запросов на HTTP-запрос", QUERY_COUNT_BUCKETS),
+        ('sql_duration_seconds', "Суммарное время выполнения SQL-запросов HTTP-запроса", LATENCY_BUCKETS),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._histograms = {name: {} for name, _, _ in self.HISTOGRAMS}
+
+    def observe(self, handler, status, duration, size, queries, query_duration):
+        values = dict(zip((name for name, _, _ in self.HISTOGRAMS), (duration, size, queries, query_duration)))
+        with self._lock:
+            key = (handler, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            for name, _, buckets in self.HISTOGRAMS:
+                histogram = self._histograms[name].get(handler)
+                if histogram is None:
+                    histogram = self._histograms[name][handler] = Histogram(buckets)
+                histogram.observe(values[name])
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        with self._lock:
+            name = METRIC_PREFIX + 'http_requests_total'
+            lines.append(f'# HELP {name} Число обработанных HTTP-запросов')
+            lines.append(f'# TYPE {name} counter')
+            for (handler, status), count in sorted(self._requests.items()):
+                lines.append(f'{name}{format_labels({"handler": handler, "status": status})} {count}')
+            for suffix, description, _ in self.HISTOGRAMS:
+                name = METRIC_PREFIX + suffix
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for handler, histogram in sorted(self._histograms[suffix].items()):
+                    for bound, count in histogram.cumulative():
+                        labels = format_labels({'handler': handler, 'le': bound})
+                        lines.append(f'{name}_bucket{labels} {count}')
+                    labels = format_labels({'handler': handler})
+                    lines.append(f'{name}_sum{labels} {histogram.sum}')
+                    lines.append(f'{name}_count{labels} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class RequestStats:
+    """Замеры одного HTTP-запроса, пока он обрабатывается рабочим потоком"""
+
+    def __init__(self, handler, record_queries):
+        self.handler = handler
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_duration = 0.0
+        self.response_size = 0
+        # (время, SQL, параметры); None - отдельные запросы не нужны
+        self.recorded = [] if record_queries else None
+
+
+_current = threading.local()
+
+
+def install_query_hook(database):
+    """Оборачивает database.execute_sql, чтобы учитывать запросы активного HTTP-запроса"""
+    execute_sql = database.execute_sql
+
+    def timed_execute_sql(sql, params=None):
+        stats = getattr(_current, 'stats', None)
+        if stats is None:
+            return execute_sql(sql, params)
+        started = time.perf_counter()
+        try:
+            return execute_sql(sql, params)
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.queries += 1
+            stats.query_duration += elapsed
+            if stats.recorded is not None and len(stats.recorded) < MAX_RECORDED_QUERIES:
+                stats.recorded.append((elapsed, sql, params))
+
+    database.execute_sql = timed_execute_sql
+
+
+install_query_hook(db)
+
+
+def handler_name(request):
+    """Имя обработчика для меток: класс и метод, 'unmatched' без обработчика"""
+    handler = getattr(request.handler, 'callable', None)
+    if handler is None:
+        return 'unmatched'
+    # Класс экземпляра, а не базовый: обработчики ресурсов API наследуют Resource.default
+    owner = getattr(handler, '__self__', None)
+    if owner is not None:
+        return f'{type(owner).__name__}.{handler.__name__}'
+    return getattr(handler, '__qualname__', repr(handler))
+
+
+def start_request(slow_threshold=None):
+    request = cherrypy.serving.request
+    _current.stats = RequestStats(handler_name(request), record_queries=slow_threshold is not None)
+
+
+def count_response_body():
+    """Оборачивает тело ответа, чтобы посчитать отданные байты (и для потоковых ответов)"""
+    stats = getattr(_current, 'stats', None)
+    response = cherrypy.serving.response
+    if stats is None or response.body is None:
+        return
+
+    def counted(chunks):
+        for chunk in chunks:
+            stats.response_size += len(chunk)
+            yield chunk
+    response.body = counted(response.body)
+
+
+def query_plan(sql, params):
+    """EXPLAIN QUERY PLAN запроса построчно (без учета в метриках)"""
+    try:
+        rows = db.execute_sql('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    except Exception as e:
+        return [f'план недоступен: {e}']
+    return [row[-1] for row in rows]
+
+
+def log_slow_request(request, handler, stats, duration):
+    lines = [f"Медленный запрос {request.method} {request.script_name}{request.path_info}"
+             f"{'?' + request.query_string if request.query_string else ''} ({handler}): "
+             f"{duration * 1000:.1f} мс, SQL: {stats.queries} запросов, {stats.query_duration * 1000:.1f} мс"]
+    for elapsed, sql, params in sorted(stats.recorded, key=lambda query: -query[0])[:SLOW_LOG_QUERIES]:
+        lines.append(f"  {elapsed * 1000:.1f} мс: {sql} (параметров: {len(params or ())})")
+        lines.extend(f"    {step}" for step in query_plan(sql, params))
+    cherrypy.log('\n'.join(lines), 'METRICS', severity=logging.WARNING)
+
+
+def finish_request(slow_threshold=None):
+    stats = getattr(_current, 'stats', None)
+    if stats is None:
+        return
+    _current.stats = None
+    request = cherrypy.serving.request
+    response = cherrypy.serving.response
+    duration = time.perf_counter() - stats.started
+    size = stats.response_size or int(response.headers.get('Content-Length') or 0)
+    status = str(response.status or 200).split(' ', 1)[0]
+    handler = stats.handler
+    registry.observe(handler, status, duration, size, stats.queries, stats.query_duration)
+    if slow_threshold is not None and duration >= slow_threshold:
+        log_slow_request(request, handler, stats, duration)
+
+
+def metrics_exposed():
+    """Разрешена ли страница /metrics (tools.metrics.expose, по умолчанию нет)"""
+    return bool(cherrypy.serving.request.config.get('tools.metrics.expose', False))
+
+
+class MetricsTool(cherrypy.Tool):
+    """Инструмент tools.metrics: замеры от начала обработки до отправки ответа"""
+
+    def __init__(self):
+        super().__init__('on_start_resource', start_request, name='metrics')
+
+    def _setup(self):
+        conf = self._merged_args()
+        slow_threshold = conf.get('slow_threshold')
+        if slow_threshold is not None:
+            slow_threshold = float(slow_threshold)
+        hooks = cherrypy.serving.request.hooks
+        hooks.attach('on_start_resource', start_request, priority=10, slow_threshold=slow_threshold)
+        # После всех инструментов before_finalize (в том числе сжатия), чтобы считать отданные байты
+        hooks.attach('before_finalize', count_response_body, priority=100)
+        hooks.attach('on_end_request', finish_request, slow_threshold=slow_threshold)
+
+
+cherrypy.tools.metrics = MetricsTool()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""Версионные миграции схемы scholarships.db.
+
+Номер последней примененной миграции хранится в PRAGMA user_version. Каждая
+миграция выполняется один раз, по порядку, в отдельной транзакции. Миграции
+идемпотентны, поэтому базы, созданные до появления этого механизма (с
+user_version = 0), доводятся до текущей схемы без ошибок.
+
+    python migrations.py            # применить недостающие миграции
+    python migrations.py --check    # проверить планы запросов (EXPLAIN QUERY PLAN)
+"""
+import argparse
+import re
+import sys
+
+from peewee import Tuple
+
+from models import (db, configure_database, Department, Student, Scholarship, TableVersion,
+                    MonthlySummary, VERSIONED_TABLES, COUNTER_TRIGGERS, VERSION_TRIGGERS,
+                    SEARCH_TRIGGERS, SUMMARY_TRIGGERS, add_counter_columns, create_search_tables,
+                    rebuild_search_index, rebuild_summary, trigger_name)
+
+
+def run_all(statements):
+    for sql in statements:
+        db.execute_sql(sql)
+
+
+def add_counters():
+    """Счетчики справок у студентов и студентов у факультетов"""
+    add_counter_columns()
+    run_all(COUNTER_TRIGGERS)
+
+
+def add_table_versions():
+    """Счетчики изменений таблиц для HTTP-кеширования"""
+    TableVersion.create_table(safe=True)
+    (TableVersion
+     .insert_many([{'name': table} for table in VERSIONED_TABLES])
+     .on_conflict_ignore()
+     .execute())
+    run_all(VERSION_TRIGGERS)
+
+
+def add_search_index():
+    """Полнотекстовый индекс FTS5"""
+    create_search_tables()
+    run_all(SEARCH_TRIGGERS)
+
+
+def add_secondary_indexes():
+    """Составные индексы под реальные запросы и статистика для планировщика"""
+    # Индекс внешнего ключа покрывается индексом (student_id, date)
+    db.execute_sql('DROP INDEX IF EXISTS scholarship_student_id')
+    for model in (Department, Student, Scholarship):
+        model._schema.create_indexes(safe=True)
+    db.execute_sql('ANALYZE')
+
+
+def add_monthly_summary():
+    """Сводка сумм и количества справок по факультетам и месяцам"""
+    MonthlySummary.create_table(safe=True)
+    run_all(SUMMARY_TRIGGERS)
+    rebuild_summary()
+
+
+def narrow_summary_cleanup():
+    """Триггеры сводки удаляют пустые строки только по затронутому ключу"""
+    # CREATE TRIGGER IF NOT EXISTS не заменяет триггеры, созданные миграцией 5
+    for sql in SUMMARY_TRIGGERS:
+        db.execute_sql(f'DROP TRIGGER IF EXISTS {trigger_name(sql)}')
+    run_all(SUMMARY_TRIGGERS)
+
+
+# Порядок не менять: номер миграции - ее позиция в списке (начиная с 1)
+MIGRATIONS = [
+    add_counters,
+    add_table_versions,
+    add_search_index,
+    add_secondary_indexes,
+    add_monthly_summary,
+    narrow_summary_cleanup,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version():
+    """Номер последней примененной миграции"""
+    return db.execute_sql('PRAGMA user_version').fetchone()[0]
+
+
+def restore_schema_objects():
+    """Пересоздает недостающие триггеры поиска и сводки и индексы моделей; возвращает их имена.
+
+    Миграции выполняются один раз по номеру версии, поэтому объект, удаленный
+    после них (например, вручную или прерванной загрузкой), они не вернут.
+    Данные, которые поддерживал пропавший триггер, пересчитываются целиком.
+    """
+    existing = {name for name, in db.execute_sql(
+        "SELECT name FROM sqlite_master WHERE type IN ('trigger', 'index')")}
+    restored = []
+    for triggers, rebuild in ((SEARCH_TRIGGERS, rebuild_search_index), (SUMMARY_TRIGGERS, rebuild_summary)):
+        missing = [sql for sql in triggers if trigger_name(sql) not in existing]
+        if missing:
+            run_all(missing)
+            rebuild()
+            restored.extend(trigger_name(sql) for sql in missing)
+    for model in (Department, Student, Scholarship):
+        missing = [index._name for index in model._meta.fields_to_index() if index._name not in existing]
+        if missing:
+            model._schema.create_indexes(safe=True)
+            restored.extend(missing)
+    return restored
+
+
+def migrate_database(out=None):
+    """Применяет недостающие миграции и восстанавливает пропавшие объекты схемы; возвращает список примененных"""
+    version = schema_version()
+    applied = []
+    for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+        with db.atomic():
+            migration()
+            db.execute_sql(f'PRAGMA user_version = {number}')
+        applied.append(migration)
+        if out is not None:
+            print(f"Миграция {number}: {migration.__doc__}", file=out)
+    with db.atomic():
+        restored = restore_schema_objects()
+    if restored and out is not None:
+        print(f"Восстановлены объекты схемы: {', '.join(restored)}", file=out)
+    return applied
+
+
+def plan_queries():
+    """Запросы страниц и фильтров, которые должны идти по индексам"""
+    scholarships = (Scholarship
+                    .select(Scholarship, Student, Department)
+                    .join(Student)
+                    .join(Department))
+    key = Tuple(Scholarship.date, Scholarship.number)
+    return {
+        'Главная: первая страница': scholarships
+            .order_by(Scholarship.date, Scholarship.number).limit(51),
+        'Главная: следующая страница': scholarships
+            .where(key > Tuple('2024-01-01', 1))
+            .order_by(Scholarship.date, Scholarship.number).limit(51),
+        'Главная: предыдущая страница': scholarships
+            .where(key < Tuple('2024-01-01', 1))
+            .order_by(Scholarship.date.desc(), Scholarship.number.desc()).limit(51),
+        'Выгрузка за период': scholarships
+            .where(Scholarship.date.between('2024-01-01', '2024-01-31'))
+            .order_by(Scholarship.date, Scholarship.number),
+        'Справки студента по дате': Scholarship.select()
+            .where(Scholarship.student == 1)
+            .order_by(Scholarship.date),
+        'Справки дороже порога': Scholarship.select()
+            .where(Scholarship.amount > 2000)
+            .order_by(Scholarship.amount),
+        'Справки в диапазоне сумм': Scholarship.select()
+            .where(Scholarship.amount.between(1000, 2000)),
+    }
+
+
+# Строка плана с полным просмотром таблицы: "SCAN t1" (SQLite 3.36+) или
+# "SCAN TABLE scholarship AS t1"; просмотр по индексу дает "... USING [COVERING] INDEX ..."
+SCAN_DETAIL = re.compile(r'SCAN (?:TABLE )?(?P<name>\S+)(?: AS (?P<alias>\S+))?'
+                         r'(?P<index> USING (?:(?:COVERING )?INDEX|INTEGER PRIMARY KEY)\b.*)?')
+# Справочники, которые планировщик после ANALYZE может просматривать целиком:
+# в них единицы строк, это не ошибка
+SMALL_TABLES = {'department'}
+
+
+def table_aliases(sql):
+    """Псевдонимы таблиц запроса из FROM и JOIN: {псевдоним: таблица}"""
+    return {alias: table for table, alias in re.findall(r'(?:FROM|JOIN) "(\w+)" AS "(\w+)"', sql)}
+
+
+def is_full_scan(detail, aliases=None):
+    """Строка плана означает полный просмотр таблицы (кроме SMALL_TABLES) или сортировку в памяти.
+
+    aliases - table_aliases(sql) запроса: по ним псевдоним из плана
+    переводится в имя таблицы.
+    """
+    match = SCAN_DETAIL.fullmatch(detail)
+    if match and not match['index']:
+        name = match['alias'] or match['name']
+        return (aliases or {}).get(name, match['name']) not in SMALL_TABLES
+    return 'TEMP B-TREE' in detail
+
+
+def check_query_plans(out=sys.stdout):
+    """Печатает EXPLAIN QUERY PLAN запросов и возвращает названия тех, что не используют индексы"""
+    failed = []
+    for name, query in plan_queries().items():
+        sql, params = query.sql()
+        plan = [row[3] for row in db.execute_sql('EXPLAIN QUERY PLAN ' + sql, params)]
+        aliases = table_aliases(sql)
+        bad = [detail for detail in plan if is_full_scan(detail, aliases)]
+        status = 'OK' if not bad else 'НЕТ ИНДЕКСА'
+        print(f"[{status}] {name}", file=out)
+        for detail in plan:
+            print(f"    {detail}", file=out)
+        if bad:
+            failed.append(name)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграции схемы базы данных справок")
+    parser.add_argument('--database', help="файл базы данных (по умолчанию scholarships.db)")
+    parser.add_argument('--check', action='store_true',
+                        help="проверить, что запросы страниц используют индексы")
+    args = parser.parse_args()
+
+    if args.database:
+        configure_database(args.database)
+    with db:
+        db.create_tables([Department, Student, Scholarship])
+        before = schema_version()
+        migrate_database(out=sys.stdout)
+        print(f"Версия схемы: {before} -> {schema_version()}")
+        failed = check_query_plans() if args.check else []
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,44 @@
 from peewee import *
+from playhouse.migrate import SqliteMigrator, migrate
+from contextlib import contextmanager
 from datetime import datetime
+import os
+import re
 
 # Database connection
-db = SqliteDatabase('scholarships.db')
+DATABASE_PATH = os.environ.get('SCHOLARSHIPS_DB', 'scholarships.db')
+
+# WAL lets readers run alongside the single writer; synchronous=normal is
+# durable across application crashes in WAL mode and avoids an fsync per commit.
+DATABASE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -64 * 1024,  # in KiB, i.e. 64 MiB of page cache per connection
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,  # ms to wait for the write lock instead of failing
+    'temp_store': 'memory',
+}
+
+# Peewee keeps one connection per thread, so every CherryPy worker reuses its own
+db = SqliteDatabase(DATABASE_PATH, pragmas=DATABASE_PRAGMAS)
+
+def configure_database(path=None, **pragmas):
+    """Point the models at another database file and/or override pragmas"""
+    db.init(path or db.database, pragmas=dict(DATABASE_PRAGMAS, **pragmas))
 
 class BaseModel(Model):
     class Meta:
         database = db
+        # save() writes only the fields that were assigned, so a stale copy of a
+        # trigger-maintained counter never overwrites the value in the table
+        only_save_dirty = True
 
 class Department(BaseModel):
     """Модель для кафедр/факультетов"""
     name = CharField(max_length=100, unique=True)
     code = CharField(max_length=10, unique=True)
+    # Denormalized counter, maintained by the triggers in COUNTER_TRIGGERS
+    student_count = IntegerField(default=0)
 
     def __str__(self):
         return self.name
@@ -21,6 +48,8 @@ class Student(BaseModel):
     full_name = CharField(max_length=200)
     student_id = CharField(max_length=20, unique=True)
     department = ForeignKeyField(Department, backref='students')
+    # Denormalized counter, maintained by the triggers in COUNTER_TRIGGERS
+    scholarship_count = IntegerField(default=0)
     created_at = DateTimeField(default=datetime.now)
 
     def __str__(self):
@@ -30,18 +59,321 @@ class Scholarship(BaseModel):
     """Модель для справок о стипендиях"""
     number = IntegerField(unique=True)
     date = DateField()
-    student = ForeignKeyField(Student, backref='scholarships')
+    # Indexed together with date below, which also serves lookups by student
+    student = ForeignKeyField(Student, backref='scholarships', index=False)
     amount = DecimalField(max_digits=10, decimal_places=2)
     destination = CharField(max_length=200)
     created_at = DateTimeField(default=datetime.now)
 
+    class Meta:
+        # Keep in sync with the secondary-indexes migration in migrations.py
+        indexes = (
+            # Keyset pagination on the main page and date-range exports
+            (('date', 'number'), False),
+            # A student's certificates in date order; also covers the foreign key
+            (('student', 'date'), False),
+            # Amount thresholds and ranges
+            (('amount',), False),
+        )
+
     def __str__(self):
         return f"Справка №{self.number} - {self.student.full_name}"
 
+class TableVersion(BaseModel):
+    """Счетчик изменений таблицы (для ETag/Last-Modified и кеша страниц)"""
+    name = CharField(max_length=50, primary_key=True)
+    version = IntegerField(default=0)
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    class Meta:
+        table_name = 'table_version'
+
+class MonthlySummary(BaseModel):
+    """Сводка по справкам факультета за месяц (поддерживается триггерами SUMMARY_TRIGGERS)"""
+    department = ForeignKeyField(Department, backref='monthly_summaries')
+    month = CharField(max_length=7)  # YYYY-MM
+    scholarship_count = IntegerField(default=0)
+    total_amount = DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        table_name = 'monthly_summary'
+        primary_key = CompositeKey('department', 'month')
+
+VERSIONED_TABLES = ('department', 'student', 'scholarship')
+
+# Every row change bumps the table's version, so cached pages built from an
+# older version are detected without re-running their queries.
+VERSION_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS {table}_version_{operation.lower()}
+       AFTER {operation} ON {table} BEGIN
+           UPDATE table_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+           WHERE name = '{table}';
+       END"""
+    for table in VERSIONED_TABLES
+    for operation in ('INSERT', 'UPDATE', 'DELETE')
+]
+
+# Keep Student.scholarship_count and Department.student_count in sync on every
+# write path (web forms, bulk loads, raw SQL), so list pages never have to count.
+COUNTER_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS scholarship_count_insert
+       AFTER INSERT ON scholarship BEGIN
+           UPDATE student SET scholarship_count = scholarship_count + 1
+           WHERE id = NEW.student_id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS scholarship_count_delete
+       AFTER DELETE ON scholarship BEGIN
+           UPDATE student SET scholarship_count = scholarship_count - 1
+           WHERE id = OLD.student_id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS scholarship_count_update
+       AFTER UPDATE OF student_id ON scholarship
+       WHEN OLD.student_id IS NOT NEW.student_id BEGIN
+           UPDATE student SET scholarship_count = scholarship_count - 1
+           WHERE id = OLD.student_id;
+           UPDATE student SET scholarship_count = scholarship_count + 1
+           WHERE id = NEW.student_id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS student_count_insert
+       AFTER INSERT ON student BEGIN
+           UPDATE department SET student_count = student_count + 1
+           WHERE id = NEW.department_id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS student_count_delete
+       AFTER DELETE ON student BEGIN
+           UPDATE department SET student_count = student_count - 1
+           WHERE id = OLD.department_id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS student_count_update
+       AFTER UPDATE OF department_id ON student
+       WHEN OLD.department_id IS NOT NEW.department_id BEGIN
+           UPDATE department SET student_count = student_count - 1
+           WHERE id = OLD.department_id;
+           UPDATE department SET student_count = student_count + 1
+           WHERE id = NEW.department_id;
+       END""",
+]
+
+def refresh_counters():
+    """Recompute the denormalized counters with one aggregate per table"""
+    with db.atomic():
+        db.execute_sql(
+            'UPDATE student SET scholarship_count = '
+            '(SELECT COUNT(*) FROM scholarship WHERE scholarship.student_id = student.id)')
+        db.execute_sql(
+            'UPDATE department SET student_count = '
+            '(SELECT COUNT(*) FROM student WHERE student.department_id = department.id)')
+
+def add_counter_columns():
+    """Add counter columns to databases created before they existed"""
+    migrator = SqliteMigrator(db)
+    operations = []
+    if 'student_count' not in {c.name for c in db.get_columns('department')}:
+        operations.append(migrator.add_column('department', 'student_count', Department.student_count))
+    if 'scholarship_count' not in {c.name for c in db.get_columns('student')}:
+        operations.append(migrator.add_column('student', 'scholarship_count', Student.scholarship_count))
+    if operations:
+        migrate(*operations)
+        refresh_counters()
+
+# Per-department, per-month totals. A certificate counts towards the month of
+# its date and the current department of its student; moving a student to
+# another department moves all of their certificates' totals with them.
+def summary_add(sign, row):
+    """SQL adding (sign=+1) or removing (sign=-1) one certificate from the summary"""
+    if sign > 0:
+        return f"""INSERT INTO monthly_summary (department_id, month, scholarship_count, total_amount)
+           SELECT department_id, substr({row}.date, 1, 7), 1, {row}.amount
+           FROM student WHERE id = {row}.student_id
+           ON CONFLICT (department_id, month) DO UPDATE SET
+               scholarship_count = scholarship_count + 1,
+               total_amount = ROUND(total_amount + excluded.total_amount, 2);"""
+    return f"""UPDATE monthly_summary SET
+               scholarship_count = scholarship_count - 1,
+               total_amount = ROUND(total_amount - {row}.amount, 2)
+           WHERE department_id = (SELECT department_id FROM student WHERE id = {row}.student_id)
+             AND month = substr({row}.date, 1, 7);
+           DELETE FROM monthly_summary
+           WHERE department_id = (SELECT department_id FROM student WHERE id = {row}.student_id)
+             AND month = substr({row}.date, 1, 7) AND scholarship_count <= 0;"""
+
+def summary_move_student(sign, department):
+    """SQL adding or removing all certificates of NEW student to/from a department"""
+    if sign > 0:
+        return f"""INSERT INTO monthly_summary (department_id, month, scholarship_count, total_amount)
+           SELECT {department}, substr(date, 1, 7), COUNT(*), ROUND(SUM(amount), 2)
+           FROM scholarship WHERE student_id = NEW.id GROUP BY substr(date, 1, 7)
+           ON CONFLICT (department_id, month) DO UPDATE SET
+               scholarship_count = scholarship_count + excluded.scholarship_count,
+               total_amount = ROUND(total_amount + excluded.total_amount, 2);"""
+    return f"""UPDATE monthly_summary SET
+               scholarship_count = monthly_summary.scholarship_count - moved.scholarship_count,
+               total_amount = ROUND(monthly_summary.total_amount - moved.total_amount, 2)
+           FROM (SELECT substr(date, 1, 7) AS month, COUNT(*) AS scholarship_count,
+                        SUM(amount) AS total_amount
+                 FROM scholarship WHERE student_id = NEW.id GROUP BY substr(date, 1, 7)) AS moved
+           WHERE monthly_summary.department_id = {department}
+             AND monthly_summary.month = moved.month;
+           DELETE FROM monthly_summary
+           WHERE department_id = {department} AND scholarship_count <= 0
+             AND month IN (SELECT substr(date, 1, 7) FROM scholarship WHERE student_id = NEW.id);"""
+
+SUMMARY_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS summary_insert
+       AFTER INSERT ON scholarship BEGIN
+           {summary_add(+1, 'NEW')}
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS summary_delete
+       AFTER DELETE ON scholarship BEGIN
+           {summary_add(-1, 'OLD')}
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS summary_update
+       AFTER UPDATE OF date, amount, student_id ON scholarship BEGIN
+           {summary_add(-1, 'OLD')}
+           {summary_add(+1, 'NEW')}
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS summary_student_department
+       AFTER UPDATE OF department_id ON student
+       WHEN OLD.department_id IS NOT NEW.department_id BEGIN
+           {summary_move_student(-1, 'OLD.department_id')}
+           {summary_move_student(+1, 'NEW.department_id')}
+       END""",
+]
+
+def rebuild_summary():
+    """Recompute monthly_summary from scratch with one aggregate query"""
+    with db.atomic():
+        db.execute_sql('DELETE FROM monthly_summary')
+        db.execute_sql(
+            'INSERT INTO monthly_summary (department_id, month, scholarship_count, total_amount) '
+            'SELECT student.department_id, substr(scholarship.date, 1, 7), COUNT(*), ROUND(SUM(scholarship.amount), 2) '
+            'FROM scholarship JOIN student ON student.id = scholarship.student_id '
+            'GROUP BY student.department_id, substr(scholarship.date, 1, 7)')
+
+# Full-text search. The FTS5 tables are contentless (the text lives only in
+# student/scholarship) and are kept in sync by triggers. unicode61 folds case
+# for Cyrillic but not "ё", so it is folded to "е" on both sides.
+def fold_yo(expression):
+    """SQL expression replacing ё/Ё with е/Е"""
+    return f"replace(replace({expression}, 'ё', 'е'), 'Ё', 'Е')"
+
+FTS_OPTIONS = "content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3'"
+
+SEARCH_TABLES = {
+    'student_fts': f"CREATE VIRTUAL TABLE student_fts USING fts5(full_name, student_id, {FTS_OPTIONS})",
+    'scholarship_fts': f"CREATE VIRTUAL TABLE scholarship_fts USING fts5(destination, {FTS_OPTIONS})",
+}
+
+SEARCH_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS student_fts_insert
+       AFTER INSERT ON student BEGIN
+           INSERT INTO student_fts (rowid, full_name, student_id)
+           VALUES (NEW.id, {fold_yo('NEW.full_name')}, NEW.student_id);
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS student_fts_delete
+       AFTER DELETE ON student BEGIN
+           INSERT INTO student_fts (student_fts, rowid, full_name, student_id)
+           VALUES ('delete', OLD.id, {fold_yo('OLD.full_name')}, OLD.student_id);
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS student_fts_update
+       AFTER UPDATE OF full_name, student_id ON student BEGIN
+           INSERT INTO student_fts (student_fts, rowid, full_name, student_id)
+           VALUES ('delete', OLD.id, {fold_yo('OLD.full_name')}, OLD.student_id);
+           INSERT INTO student_fts (rowid, full_name, student_id)
+           VALUES (NEW.id, {fold_yo('NEW.full_name')}, NEW.student_id);
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS scholarship_fts_insert
+       AFTER INSERT ON scholarship BEGIN
+           INSERT INTO scholarship_fts (rowid, destination)
+           VALUES (NEW.id, {fold_yo('NEW.destination')});
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS scholarship_fts_delete
+       AFTER DELETE ON scholarship BEGIN
+           INSERT INTO scholarship_fts (scholarship_fts, rowid, destination)
+           VALUES ('delete', OLD.id, {fold_yo('OLD.destination')});
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS scholarship_fts_update
+       AFTER UPDATE OF destination ON scholarship BEGIN
+           INSERT INTO scholarship_fts (scholarship_fts, rowid, destination)
+           VALUES ('delete', OLD.id, {fold_yo('OLD.destination')});
+           INSERT INTO scholarship_fts (rowid, destination)
+           VALUES (NEW.id, {fold_yo('NEW.destination')});
+       END""",
+]
+
+def rebuild_search_index():
+    """Refill the FTS5 tables from student and scholarship"""
+    with db.atomic():
+        db.execute_sql("INSERT INTO student_fts (student_fts) VALUES ('delete-all')")
+        db.execute_sql(
+            'INSERT INTO student_fts (rowid, full_name, student_id) '
+            f"SELECT id, {fold_yo('full_name')}, student_id FROM student")
+        db.execute_sql("INSERT INTO scholarship_fts (scholarship_fts) VALUES ('delete-all')")
+        db.execute_sql(
+            'INSERT INTO scholarship_fts (rowid, destination) '
+            f"SELECT id, {fold_yo('destination')} FROM scholarship")
+
+def create_search_tables():
+    """Create missing FTS5 tables and index the rows that already exist"""
+    existing = set(db.get_tables())
+    missing = [name for name in SEARCH_TABLES if name not in existing]
+    for name in missing:
+        db.execute_sql(SEARCH_TABLES[name])
+    if missing:
+        rebuild_search_index()
+
+# Bulk loads. The summary and FTS triggers on scholarship and its secondary
+# indexes cost more per inserted row than the insert itself, so an explicit bulk
+# import drops them, inserts, and rebuilds each once from the whole table.
+BULK_LOAD_TRIGGERS = [sql for sql in SUMMARY_TRIGGERS + SEARCH_TRIGGERS
+                      if re.search(r'\bON scholarship\b', sql)]
+
+def trigger_name(sql):
+    """Name of the trigger created by a CREATE TRIGGER statement"""
+    return re.search(r'CREATE TRIGGER IF NOT EXISTS (\w+)', sql).group(1)
+
+class ExclusiveAccessError(OperationalError):
+    """The database is open in another connection, so a bulk load cannot lock it"""
+
+@contextmanager
+def bulk_load_scholarships():
+    """Insert certificates without per-row summary, FTS and index upkeep; rebuild them on exit.
+    The rebuild covers the whole table, not just the new rows. Everything runs in one
+    transaction under an exclusive lock, so no other connection sees the dropped schema
+    and a failed or killed load rolls back. Inserts inside must not open savepoints."""
+    db.execute_sql('PRAGMA locking_mode = EXCLUSIVE')
+    locked = False
+    try:
+        with db.atomic('EXCLUSIVE'):
+            locked = True
+            for sql in BULK_LOAD_TRIGGERS:
+                db.execute_sql(f'DROP TRIGGER IF EXISTS {trigger_name(sql)}')
+            # The unique index on number stays: imports rely on it for conflicts
+            for index in Scholarship._meta.fields_to_index():
+                if not index._unique:
+                    db.execute_sql(f'DROP INDEX IF EXISTS "{index._name}"')
+            yield
+            Scholarship._schema.create_indexes(safe=True)
+            rebuild_search_index()
+            rebuild_summary()
+            for sql in BULK_LOAD_TRIGGERS:
+                db.execute_sql(sql)
+    except OperationalError as e:
+        if locked:
+            raise
+        raise ExclusiveAccessError(f'bulk load needs exclusive access to the database ({e})') from e
+    finally:
+        # In normal mode the exclusive lock is released on the next read
+        db.execute_sql('PRAGMA locking_mode = NORMAL')
+        db.execute_sql('SELECT COUNT(*) FROM sqlite_master')
+
 # Create tables
 def create_tables():
+    # migrations.py builds on the definitions in this module
+    from migrations import migrate_database
     with db:
         db.create_tables([Department, Student, Scholarship])
+        migrate_database()
 
 # Initialize with sample data
 def init_sample_data():
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Отчеты по суммам и количеству справок по факультетам и месяцам.
+
+Отчеты читают таблицу monthly_summary, которую поддерживают триггеры
+(см. models.SUMMARY_TRIGGERS), поэтому стоят O(факультеты × месяцы), а не
+O(справки). Если сводка разошлась с данными (например, после ручной правки
+базы с отключенными триггерами), ее можно пересчитать:
+
+    python reports.py --rebuild
+"""
+import argparse
+
+from peewee import fn
+
+from models import db, configure_database, Department, MonthlySummary, rebuild_summary
+
+
+def parse_year(year):
+    """Проверяет год отчета (ValueError, если это не четырехзначное число)"""
+    year = str(year)
+    if len(year) != 4 or not year.isdigit():
+        raise ValueError(f"Некорректный год: {year}")
+    return year
+
+
+def monthly_totals(year=None, department=None):
+    """Строки сводки (факультет, месяц, количество, сумма) по месяцам и факультетам.
+
+    year - год вида YYYY, department - код факультета.
+    """
+    query = (MonthlySummary
+             .select(MonthlySummary, Department)
+             .join(Department)
+             .order_by(MonthlySummary.month, Department.code))
+    if year:
+        year = parse_year(year)
+        query = query.where(MonthlySummary.month.between(f'{year}-01', f'{year}-12'))
+    if department:
+        query = query.where(Department.code == department)
+    return query
+
+
+def report_years():
+    """Годы, за которые есть справки, по возрастанию"""
+    month = MonthlySummary.month
+    return [year for year, in (MonthlySummary
+                               .select(fn.substr(month, 1, 4))
+                               .distinct()
+                               .order_by(fn.substr(month, 1, 4))
+                               .tuples())]
+
+
+def grand_total(rows):
+    """Итоговые количество и сумма по строкам сводки"""
+    count = sum(row.scholarship_count for row in rows)
+    amount = sum(row.total_amount for row in rows)
+    return count, amount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отчеты по справкам по факультетам и месяцам")
+    parser.add_argument('--database', help="файл базы данных (по умолчанию scholarships.db)")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="пересчитать сводку по всем справкам")
+    parser.add_argument('--year', help="год отчета (YYYY)")
+    parser.add_argument('--department', help="код факультета")
+    args = parser.parse_args()
+
+    if args.database:
+        configure_database(args.database)
+    with db:
+        if args.rebuild:
+            rebuild_summary()
+            print(f"Сводка пересчитана: {MonthlySummary.select().count()} строк")
+            return
+        rows = list(monthly_totals(args.year, args.department))
+        for row in rows:
+            print(f"{row.month}\t{row.department.code}\t{row.scholarship_count}\t{row.total_amount}")
+        count, amount = grand_total(rows)
+        print(f"Итого\t\t{count}\t{amount}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,100 @@
 #!/usr/bin/env python3
-import cherrypy
-import os
-from models import create_tables, init_sample_data
-from web_app import ScholarshipWebApp
+import time
+
+# Startup time is measured from here, so it includes importing the application;
+# the imports below therefore deliberately follow this statement
+STARTED = time.perf_counter()
+
+import argparse  # noqa: E402
+import cherrypy  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+from models import db, configure_database, create_tables, init_sample_data  # noqa: E402
+from migrations import SCHEMA_VERSION, schema_version  # noqa: E402
+from web_app import ScholarshipWebApp, subscribe_database  # noqa: E402
+from api import ScholarshipApi  # noqa: E402
+import metrics  # noqa: E402  (registers cherrypy.tools.metrics)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scholarship web application server")
+    parser.add_argument('--production', action='store_true',
+                        help="production profile: only check the schema version (no DDL, no sample data), "
+                             "no autoreload")
+    parser.add_argument('--database', help="database file (default: SCHOLARSHIPS_DB or scholarships.db)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--threads', type=int, default=10, help="worker thread pool size")
+    parser.add_argument('--socket-queue', type=int, default=5,
+                        help="listen backlog for connections waiting to be accepted")
+    parser.add_argument('--socket-timeout', type=float, default=10,
+                        help="seconds a blocking read or write on a client socket may wait, "
+                             "including an idle keep-alive connection waiting for its next request")
+    parser.add_argument('--keep-alive-connections', type=int, default=10,
+                        help="maximum number of idle keep-alive connections")
+    parser.add_argument('--expose-metrics', action='store_true',
+                        help="serve request and SQL metrics at /metrics to any client that can reach the server")
+    return parser.parse_args()
+
+def check_schema():
+    """Refuse to start on a database that migrations.py has not brought up to date"""
+    with db:
+        version = schema_version()
+    if version != SCHEMA_VERSION:
+        sys.exit(f"Database schema version is {version}, the application needs {SCHEMA_VERSION}; "
+                 f"run 'python migrations.py' before starting the server")
 
 def main():
-    # Initialize database
-    print("Initializing database...")
-    create_tables()
-    init_sample_data()
-    print("Database initialized!")
+    args = parse_args()
+    if args.database:
+        configure_database(args.database)
+
+    if args.production:
+        # Startup does no DDL and no sample-data round trips: migrations run separately at deploy time
+        check_schema()
+    else:
+        # Initialize database
+        print("Initializing database...")
+        create_tables()
+        init_sample_data()
+        db.close()
+        print("Database initialized!")
 
     # Configure CherryPy
     cherrypy.config.update({
-        'server.socket_host': '127.0.0.1',
-        'server.socket_port': 8080,
-        'engine.autoreload.on': True,
-        'log.screen': True
+        'server.socket_host': args.host,
+        'server.socket_port': args.port,
+        'server.thread_pool': args.threads,
+        'server.socket_queue_size': args.socket_queue,
+        'server.socket_timeout': args.socket_timeout,
+        # Per-handler latency and SQL metrics; /metrics answers 404 unless explicitly exposed
+        'tools.metrics.on': True,
+        'tools.metrics.expose': args.expose_metrics,
     })
+    if args.production:
+        # The production environment also turns off autoreload, so no thread polls the source files
+        cherrypy.config.update({'environment': 'production', 'engine.autoreload.on': False})
+    else:
+        cherrypy.config.update({'engine.autoreload.on': True, 'log.screen': True})
+    # Log requests slower than SCHOLARSHIPS_SLOW_REQUEST seconds with their SQL and query plans
+    slow_request = os.environ.get('SCHOLARSHIPS_SLOW_REQUEST')
+    if slow_request:
+        cherrypy.config.update({'tools.metrics.slow_threshold': float(slow_request)})
+
+    # One reusable database connection per worker thread
+    subscribe_database()
+
+    # Mount the JSON API next to the HTML application
+    cherrypy.tree.mount(ScholarshipApi(), '/api')
+    cherrypy.tree.mount(ScholarshipWebApp(), '/')
 
-    # Mount the application
-    cherrypy.quickstart(ScholarshipWebApp(), '/')
+    cherrypy.engine.signals.subscribe()
+    cherrypy.engine.start()
+    # The HTTP server object only exists once the engine has started it
+    cherrypy.server.httpserver.keep_alive_conn_limit = args.keep_alive_connections
+    print(f"Serving on http://{args.host}:{args.port}/ "
+          f"(started in {(time.perf_counter() - STARTED) * 1000:.0f} ms, "
+          f"{'production' if args.production else 'development'} profile)", flush=True)
+    cherrypy.engine.block()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,72 @@
+"""Полнотекстовый поиск студентов и справок по таблицам FTS5 (см. models.SEARCH_TABLES)."""
+import re
+
+from models import db, Department, Student, Scholarship
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+
+def fold_yo(text):
+    """Заменяет ё/Ё на е/Е так же, как это делают триггеры индекса"""
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def match_expression(text):
+    """Преобразует ввод пользователя в запрос FTS5: каждое слово ищется как префикс.
+
+    Возвращает None, если в тексте нет ни одного слова.
+    """
+    words = re.findall(r'\w+', fold_yo(text))
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def ranked_ids(table, expression, limit):
+    """id строк, найденных в FTS-таблице, по убыванию релевантности (bm25).
+
+    ORDER BY rank с LIMIT над MATCH FTS5 выполняет сам: bm25 считается для
+    каждого совпадения, но хранятся только limit лучших строк.
+    """
+    cursor = db.execute_sql(
+        f'SELECT rowid FROM {table} WHERE {table} MATCH ? ORDER BY rank LIMIT ?',
+        (expression, limit))
+    return [row[0] for row in cursor]
+
+
+def in_rank_order(ids, rows):
+    """Упорядочивает строки по списку id из FTS-индекса"""
+    position = {pk: i for i, pk in enumerate(ids)}
+    return sorted(rows, key=lambda row: position[row.id])
+
+
+def search_students(text, limit=DEFAULT_SEARCH_LIMIT):
+    """Студенты, у которых ФИО или номер начинаются с введенных слов"""
+    expression = match_expression(text)
+    if expression is None:
+        return []
+    ids = ranked_ids('student_fts', expression, limit)
+    if not ids:
+        return []
+    students = (Student
+                .select(Student, Department)
+                .join(Department)
+                .where(Student.id.in_(ids)))
+    return in_rank_order(ids, students)
+
+
+def search_scholarships(text, limit=DEFAULT_SEARCH_LIMIT):
+    """Справки, у которых поле «куда выдается» содержит введенные слова"""
+    expression = match_expression(text)
+    if expression is None:
+        return []
+    ids = ranked_ids('scholarship_fts', expression, limit)
+    if not ids:
+        return []
+    scholarships = (Scholarship
+                    .select(Scholarship, Student, Department)
+                    .join(Student)
+                    .join(Department)
+                    .where(Scholarship.id.in_(ids)))
+    return in_rank_order(ids, scholarships)
@@ -0,0 +1,417 @@
+"""Шаблоны HTML-страниц ScholarshipWebApp.
+
+Шаблоны компилируются один раз при импорте модуля: фрагменты с подстановками
+превращаются в функции, а неизменяемые части страниц (стили, навигация,
+заголовки таблиц) отрисовываются заранее и дальше только склеиваются.
+Подстановки экранируются для HTML; без экранирования вставляются только
+аргументы, перечисленные в raw (уже отрисованные фрагменты).
+"""
+import html
+import re
+
+CONTENT_MARK = '\x00content\x00'
+PLACEHOLDER = re.compile(r'\{([^{}]+)\}')
+
+
+def escape(value):
+    """Значение подстановки как текст HTML (с экранированием кавычек для атрибутов)"""
+    return html.escape(str(value), quote=True)
+
+
+def compile_fragment(source, *names, raw=()):
+    """Компилирует шаблон с подстановками {выражение} в функцию от аргументов names.
+
+    Шаблон превращается в f-строку, поэтому вызов стоит столько же, сколько
+    обычная интерполяция, без повторного разбора текста шаблона. Каждая
+    подстановка экранируется, кроме аргументов из raw, которые вставляются
+    как есть.
+    """
+    if '"""' in source or source.endswith('"'):
+        raise ValueError("Шаблон не может содержать тройные кавычки или оканчиваться кавычкой")
+    unknown = set(raw) - set(names)
+    if unknown:
+        raise ValueError(f"raw содержит имена, которых нет среди аргументов: {', '.join(sorted(unknown))}")
+
+    def substitution(match):
+        expression = match.group(1).strip()
+        return match.group(0) if expression in raw else f'{{_escape({expression})}}'
+
+    source = PLACEHOLDER.sub(substitution, source)
+    return eval(f'lambda {", ".join(names)}: f"""{source}"""', {'_escape': escape})
+
+
+def render_many(fragment, items):
+    """Отрисовывает фрагмент для каждого элемента и склеивает результат одним join"""
+    return ''.join(map(fragment, items))
+
+
+# Partials: стили
+BASE_STYLE = """
+                body { font-family: Arial, sans-serif; margin: 20px; }
+                .btn { padding: 8px 16px; margin: 5px; text-decoration: none;
+                       background-color: #007bff; color: white; border-radius: 4px; border: none; cursor: pointer; }
+                .btn:hover { background-color: #0056b3; }
+                .nav { margin-bottom: 20px; }
+                .nav a { margin-right: 15px; }"""
+
+TABLE_STYLE = """
+                table { border-collapse: collapse; width: 100%; margin: 20px 0; }
+                th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+                th { background-color: #f2f2f2; }
+                .btn-danger { background-color: #dc3545; }
+                .btn-danger:hover { background-color: #c82333; }
+                .container { max-width: 1200px; margin: 0 auto; }
+                .pagination { margin: 20px 0; }"""
+
+FORM_STYLE = """
+                .btn-secondary { background-color: #6c757d; }
+                .btn-secondary:hover { background-color: #545b62; }
+                .form-group { margin: 15px 0; }
+                .form-group label { display: inline-block; width: 150px; font-weight: bold; }
+                .form-group input, .form-group select { padding: 8px; width: 250px; border: 1px solid #ddd; border-radius: 4px; }
+                .container { max-width: 800px; margin: 0 auto; }
+                .error { color: red; margin: 10px 0; padding: 10px; background-color: #f8d7da; border-radius: 4px; }
+                .success { color: green; margin: 10px 0; padding: 10px; background-color: #d4edda; border-radius: 4px; }"""
+
+# Partials: навигация
+NAV_MAIN = ('/', 'Главная')
+NAV_STUDENTS = ('/students', 'Студенты')
+NAV_DEPARTMENTS = ('/departments', 'Факультеты')
+NAV_ADD_SCHOLARSHIP = ('/add_scholarship', 'Добавить справку')
+NAV_ADD_STUDENT = ('/add_student', 'Добавить студента')
+NAV_SEARCH = ('/search', 'Поиск')
+NAV_REPORTS = ('/reports', 'Отчеты')
+NAV_DEFAULT = (NAV_MAIN, NAV_STUDENTS, NAV_DEPARTMENTS, NAV_SEARCH, NAV_REPORTS)
+
+nav_link = compile_fragment('''
+                    <a href="{link[0]}" class="btn">{link[1]}</a>''', 'link')
+
+layout = compile_fragment('''
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <title>{title}</title>
+            <meta charset="utf-8">
+            <style>{style}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <h1>{heading}</h1>
+
+                <div class="nav">{nav}
+                </div>
+                {content}
+            </div>
+        </body>
+        </html>
+        ''', 'title', 'heading', 'style', 'nav', 'content', raw=('style', 'nav', 'content'))
+
+
+class Page:
+    """Каркас страницы, отрисованный один раз: содержимое вставляется между head и tail"""
+
+    def __init__(self, title, heading, style, nav_links=NAV_DEFAULT):
+        html = layout(title, heading, style, render_many(nav_link, nav_links), CONTENT_MARK)
+        self.head, self.tail = html.split(CONTENT_MARK)
+
+    def render(self, *parts):
+        """Собирает страницу из каркаса и фрагментов содержимого"""
+        return ''.join((self.head, *parts, self.tail))
+
+
+error_block = compile_fragment('''
+                <div class="error">{message}</div>
+                ''', 'message')
+
+
+def render_error(message):
+    """Блок с сообщением об ошибке (пустая строка, если ошибки нет)"""
+    return error_block(message) if message else ''
+
+
+# Список справок
+INDEX_PAGE = Page(
+    'Система управления справками о стипендиях',
+    'Система управления справками о стипендиях',
+    BASE_STYLE + TABLE_STYLE,
+    NAV_DEFAULT + (NAV_ADD_SCHOLARSHIP,)
+)
+
+table_heading = compile_fragment('''
+                <h2>{title}</h2>''', 'title')
+
+SCHOLARSHIP_TABLE_HEAD = '''
+                <table>
+                    <thead>
+                        <tr>
+                            <th>№</th>
+                            <th>Дата</th>
+                            <th>Студент</th>
+                            <th>Факультет</th>
+                            <th>Размер стипендии</th>
+                            <th>Куда выдается</th>
+                            <th>Действия</th>
+                        </tr>
+                    </thead>
+                    <tbody>'''
+
+scholarship_row = compile_fragment('''
+                        <tr>
+                            <td>{s.number}</td>
+                            <td>{s.date}</td>
+                            <td>{s.student.full_name}</td>
+                            <td>{s.student.department.name}</td>
+                            <td>{s.amount} руб.</td>
+                            <td>{s.destination}</td>
+                            <td>
+                                <a href="/edit_scholarship/{s.id}" class="btn">Редактировать</a>
+                                <a href="/delete_scholarship/{s.id}" class="btn btn-danger"
+                                   onclick="return confirm('Вы уверены?')">Удалить</a>
+                            </td>
+                        </tr>''', 's')
+
+TABLE_TAIL = '''
+                    </tbody>
+                </table>'''
+
+page_link = compile_fragment('''
+                    <a href="{url}" class="btn">{label}</a>''', 'url', 'label')
+
+page_size_option = compile_fragment('''
+                            <option value="{size}" {"selected" if size == current else ""}>{size} на странице</option>''',
+                                    'size', 'current')
+
+page_size_form = compile_fragment('''
+                    <form method="get" action="/" style="display: inline;">
+                        <input type="hidden" name="order" value="{order}">
+                        <select name="per_page" onchange="this.form.submit()">{options}
+                        </select>
+                    </form>''', 'order', 'options', raw=('options',))
+
+PAGE_SIZES = (25, 50, 100, 200)
+
+# Список студентов
+STUDENTS_PAGE = Page('Студенты', 'Список студентов', BASE_STYLE + TABLE_STYLE,
+                     NAV_DEFAULT + (NAV_ADD_STUDENT,))
+
+STUDENT_TABLE_HEAD = '''
+                <table>
+                    <thead>
+                        <tr>
+                            <th>ID</th>
+                            <th>ФИО</th>
+                            <th>Номер студента</th>
+                            <th>Факультет</th>
+                            <th>Количество справок</th>
+                            <th>Действия</th>
+                        </tr>
+                    </thead>
+                    <tbody>'''
+
+student_row = compile_fragment('''
+                        <tr>
+                            <td>{s.id}</td>
+                            <td>{s.full_name}</td>
+                            <td>{s.student_id}</td>
+                            <td>{s.department.name}</td>
+                            <td>{s.scholarship_count}</td>
+                            <td>
+                                <a href="/edit_student/{s.id}" class="btn">Редактировать</a>
+                            </td>
+                        </tr>''', 's')
+
+# Список факультетов
+DEPARTMENTS_PAGE = Page('Факультеты', 'Список факультетов', BASE_STYLE + TABLE_STYLE)
+
+DEPARTMENT_TABLE_HEAD = '''
+                <table>
+                    <thead>
+                        <tr>
+                            <th>ID</th>
+                            <th>Название</th>
+                            <th>Код</th>
+                            <th>Количество студентов</th>
+                        </tr>
+                    </thead>
+                    <tbody>'''
+
+department_row = compile_fragment('''
+                        <tr>
+                            <td>{d.id}</td>
+                            <td>{d.name}</td>
+                            <td>{d.code}</td>
+                            <td>{d.student_count}</td>
+                        </tr>''', 'd')
+
+# Поиск
+SEARCH_PAGE = Page('Поиск', 'Поиск студентов и справок', BASE_STYLE + TABLE_STYLE)
+
+search_form = compile_fragment('''
+                <form method="get" action="/search">
+                    <input type="search" name="q" value="{query}" placeholder="ФИО, номер студента или куда выдается" size="50" autofocus>
+                    <button type="submit" class="btn">Найти</button>
+                </form>''', 'query')
+
+NOTHING_FOUND = '''
+                <p>Ничего не найдено</p>'''
+
+# Отчеты
+REPORTS_PAGE = Page('Отчеты', 'Справки по факультетам и месяцам', BASE_STYLE + TABLE_STYLE)
+
+report_option = compile_fragment('''
+                            <option value="{value}" {"selected" if value == current else ""}>{label}</option>''',
+                                 'value', 'label', 'current')
+
+report_filter_form = compile_fragment('''
+                <form method="get" action="/reports">
+                    <select name="year">
+                        <option value="">Все годы</option>{year_options}
+                    </select>
+                    <select name="department">
+                        <option value="">Все факультеты</option>{department_options}
+                    </select>
+                    <button type="submit" class="btn">Показать</button>
+                </form>''', 'year_options', 'department_options', raw=('year_options', 'department_options'))
+
+REPORT_TABLE_HEAD = '''
+                <table>
+                    <thead>
+                        <tr>
+                            <th>Месяц</th>
+                            <th>Факультет</th>
+                            <th>Количество справок</th>
+                            <th>Сумма</th>
+                        </tr>
+                    </thead>
+                    <tbody>'''
+
+report_row = compile_fragment('''
+                        <tr>
+                            <td>{r.month}</td>
+                            <td>{r.department.name}</td>
+                            <td>{r.scholarship_count}</td>
+                            <td>{r.total_amount} руб.</td>
+                        </tr>''', 'r')
+
+report_total_row = compile_fragment('''
+                        <tr>
+                            <th colspan="2">Итого</th>
+                            <th>{count}</th>
+                            <th>{amount} руб.</th>
+                        </tr>''', 'count', 'amount')
+
+# Формы справок
+ADD_SCHOLARSHIP_PAGE = Page('Добавить справку', 'Добавить справку о стипендии', BASE_STYLE + FORM_STYLE)
+EDIT_SCHOLARSHIP_PAGE = Page('Редактирование справки', 'Редактирование справки', BASE_STYLE + FORM_STYLE)
+
+scholarship_form = compile_fragment('''
+                <form method="post">
+                    <div class="form-group">
+                        <label for="number">Номер справки:</label>
+                        <input type="number" id="number" name="number" required min="1" value="{values.get('number', '')}">
+                    </div>
+
+                    <div class="form-group">
+                        <label for="date">Дата:</label>
+                        <input type="date" id="date" name="date" required value="{values.get('date', '')}">
+                    </div>
+
+                    <div class="form-group">
+                        <label for="student">Студент:</label>
+                        <input type="text" id="student" list="student_choices" autocomplete="off" required
+                               placeholder="ФИО или номер студента" value="{values.get('student', '')}">
+                        <datalist id="student_choices"></datalist>
+                        <input type="hidden" id="student_id" name="student_id" value="{values.get('student_id', '')}">
+                    </div>
+
+                    <div class="form-group">
+                        <label for="amount">Размер стипендии:</label>
+                        <input type="number" step="0.01" id="amount" name="amount" required min="0" value="{values.get('amount', '')}">
+                    </div>
+
+                    <div class="form-group">
+                        <label for="destination">Куда выдается:</label>
+                        <input type="text" id="destination" name="destination" required maxlength="200" value="{values.get('destination', '')}">
+                    </div>
+
+                    <div class="form-group">
+                        <button type="submit" class="btn">{submit_label}</button>
+                        <a href="/" class="btn btn-secondary">Отмена</a>
+                    </div>
+                </form>''', 'values', 'submit_label')
+
+# Выбор студента в форме справки: варианты запрашиваются у /student_lookup по мере
+# ввода, а в скрытое поле student_id попадает id выбранного варианта
+STUDENT_PICKER_SCRIPT = '''
+                <script>
+                (function () {
+                    var input = document.getElementById('student');
+                    var hidden = document.getElementById('student_id');
+                    var list = document.getElementById('student_choices');
+                    var ids = {};
+                    var timer = null;
+
+                    function choose() {
+                        hidden.value = ids[input.value] || '';
+                        input.setCustomValidity(hidden.value ? '' : 'Выберите студента из списка');
+                    }
+
+                    function lookup() {
+                        fetch('/student_lookup?q=' + encodeURIComponent(input.value))
+                            .then(function (response) { return response.json(); })
+                            .then(function (students) {
+                                list.innerHTML = '';
+                                students.forEach(function (student) {
+                                    var option = document.createElement('option');
+                                    option.value = student.label;
+                                    ids[student.label] = student.id;
+                                    list.appendChild(option);
+                                });
+                                choose();
+                            });
+                    }
+
+                    if (hidden.value) {
+                        ids[input.value] = hidden.value;
+                    }
+                    input.addEventListener('input', function () {
+                        choose();
+                        clearTimeout(timer);
+                        if (input.value.trim()) {
+                            timer = setTimeout(lookup, 200);
+                        }
+                    });
+                })();
+                </script>'''
+
+# Форма студента
+ADD_STUDENT_PAGE = Page('Добавить студента', 'Добавить студента', BASE_STYLE + FORM_STYLE)
+
+department_option = compile_fragment('<option value="{d.id}">{d.name}</option>', 'd')
+
+student_form = compile_fragment('''
+                <form method="post">
+                    <div class="form-group">
+                        <label for="full_name">ФИО:</label>
+                        <input type="text" id="full_name" name="full_name" required>
+                    </div>
+
+                    <div class="form-group">
+                        <label for="student_id">Номер студента:</label>
+                        <input type="text" id="student_id" name="student_id" required>
+                    </div>
+
+                    <div class="form-group">
+                        <label for="department_id">Факультет:</label>
+                        <select id="department_id" name="department_id" required>
+                            <option value="">Выберите факультет</option>
+                            {department_options}
+                        </select>
+                    </div>
+
+                    <div class="form-group">
+                        <button type="submit" class="btn">Добавить студента</button>
+                        <a href="/students" class="btn btn-secondary">Отмена</a>
+                    </div>
+                </form>''', 'department_options', raw=('department_options',))
@@ -0,0 +1,68 @@
+from api import DepartmentsResource, ScholarshipsResource, StudentsResource
+from caching import PageCache, page_cache, table_versions
+from models import Department, Student, Scholarship, MonthlySummary, rebuild_summary
+
+
+def etag(*models):
+    return '-'.join(f'{row.name}.{row.version}' for row in table_versions(models))
+
+
+def test_page_cache_keeps_page_for_its_etag():
+    cache = PageCache(max_pages=2)
+    cache.put('a', '"1"', 'page a')
+    assert cache.get('a', '"1"') == 'page a'
+    assert cache.get('a', '"2"') is None
+    cache.put('b', '"1"', 'page b')
+    cache.put('c', '"1"', 'page c')
+    assert cache.get('a', '"1"') is None
+    assert len(cache) == 2
+
+
+def test_write_changes_etag_and_drops_cached_pages(database):
+    department = Department.create(name='Факультет', code='Ф')
+    before = etag(Scholarship, Student, Department)
+    page_cache.put(('/scholarships', ''), before, 'page')
+
+    result = StudentsResource().bulk_create([{'full_name': 'Иванов', 'student_id': '1', 'department': department.id}])
+    assert result['created'] == 1
+    assert etag(Scholarship, Student, Department) != before
+    assert page_cache.get(('/scholarships', ''), before) is None
+
+
+def test_bulk_create_reports_errors_per_record(database):
+    department = Department.create(name='Факультет', code='Ф')
+    student = Student.create(full_name='Иванов', student_id='1', department=department)
+    records = [
+        {'number': 1, 'date': '2024-01-10', 'student': student.id, 'amount': 100.5, 'destination': 'Банк'},
+        {'number': 1, 'date': '2024-01-11', 'student': student.id, 'amount': 10, 'destination': 'Банк'},
+        {'number': 2, 'date': '2024-01-12', 'student': 999, 'amount': 10, 'destination': 'Банк'},
+        {'number': 3, 'date': 'вчера', 'student': student.id, 'amount': 10, 'destination': 'Банк'},
+        {'number': 4, 'date': '2024-02-01', 'student': student.id, 'amount': 20, 'destination': 'Банк'},
+    ]
+
+    result = ScholarshipsResource().bulk_create(records)
+    assert (result['created'], result['errors']) == (2, 3)
+    assert [('id' in item) for item in result['results']] == [True, False, False, False, True]
+    assert Student.get_by_id(student.id).scholarship_count == 2
+    by_triggers = list(MonthlySummary.select().order_by(MonthlySummary.month).tuples())
+    rebuild_summary()
+    assert list(MonthlySummary.select().order_by(MonthlySummary.month).tuples()) == by_triggers
+
+
+def test_bulk_update_moves_counters(database):
+    resource = DepartmentsResource()
+    first, second = [item['id'] for item in resource.bulk_create([
+        {'name': 'Первый', 'code': 'П'}, {'name': 'Второй', 'code': 'В'}])['results']]
+    students = StudentsResource()
+    ids = [item['id'] for item in students.bulk_create([
+        {'full_name': f'Студент {i}', 'student_id': str(i), 'department': first} for i in range(3)])['results']]
+
+    result = students.bulk_update([
+        {'id': ids[0], 'department': second},
+        {'id': ids[1], 'student_id': '2'},
+        {'id': 999, 'full_name': 'Нет такого'},
+        {'full_name': 'Без id'},
+    ])
+    assert (result['updated'], result['errors']) == (1, 3)
+    assert [Department.get_by_id(pk).student_count for pk in (first, second)] == [2, 1]
+    assert Student.get_by_id(ids[1]).student_id == '1'
@@ -0,0 +1,57 @@
+import io
+
+import pytest
+
+from migrations import check_query_plans, is_full_scan, plan_queries, table_aliases
+from models import db, Department, Student, Scholarship
+
+
+def fill(count=200):
+    department = Department.create(name='Факультет', code='Ф')
+    students = [Student.create(full_name=f'Студент {i}', student_id=f's{i}', department=department)
+                for i in range(10)]
+    for number in range(1, count + 1):
+        Scholarship.create(number=number, date=f'2024-{number % 12 + 1:02d}-01',
+                           student=students[number % 10], amount=1000 + number, destination='Банк')
+    db.execute_sql('ANALYZE')
+
+
+@pytest.mark.parametrize('detail, aliases, expected', [
+    ('SCAN t1', {'t1': 'scholarship'}, True),
+    ('SCAN scholarship', {}, True),
+    ('SCAN TABLE scholarship AS t1', {}, True),
+    ('SCAN TABLE scholarship', {}, True),
+    ('SCAN t7', {'t7': 'student'}, True),
+    ('SCAN t3', {'t3': 'department'}, False),
+    ('SCAN TABLE department AS t3', {}, False),
+    ('SCAN t1 USING INDEX scholarship_date_number', {'t1': 'scholarship'}, False),
+    ('SCAN t1 USING COVERING INDEX scholarship_amount', {'t1': 'scholarship'}, False),
+    ('SCAN TABLE scholarship AS t1 USING COVERING INDEX scholarship_amount', {}, False),
+    ('SEARCH t1 USING INDEX scholarship_amount (amount>?)', {'t1': 'scholarship'}, False),
+    ('SEARCH t2 USING INTEGER PRIMARY KEY (rowid=?)', {'t2': 'student'}, False),
+    ('SCAN CONSTANT ROW', {}, False),
+    ('USE TEMP B-TREE FOR ORDER BY', {}, True),
+])
+def test_is_full_scan(detail, aliases, expected):
+    assert is_full_scan(detail, aliases) is expected
+
+
+def test_query_plans_use_indexes(database):
+    fill()
+    out = io.StringIO()
+    assert check_query_plans(out) == []
+    assert 'SCAN' in out.getvalue() or 'SEARCH' in out.getvalue()
+
+
+def test_query_plans_detect_missing_index(database):
+    fill()
+    db.execute_sql('DROP INDEX scholarship_amount')
+    db.execute_sql('ANALYZE')
+    failed = check_query_plans(io.StringIO())
+    assert 'Справки дороже порога' in failed
+    assert 'Справки в диапазоне сумм' in failed
+
+
+def test_table_aliases():
+    sql, _ = plan_queries()['Главная: первая страница'].sql()
+    assert table_aliases(sql) == {'t1': 'scholarship', 't2': 'student', 't3': 'department'}
@@ -0,0 +1,217 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from migrations import SCHEMA_VERSION, migrate_database, restore_schema_objects, schema_version
+from models import (db, configure_database, Department, Student, Scholarship, TableVersion,
+                    MonthlySummary, bulk_load_scholarships, rebuild_search_index, rebuild_summary,
+                    refresh_counters)
+from search import search_scholarships, search_students
+
+# Схема scholarships.db до появления миграций (user_version = 0)
+VERSION_0_SCHEMA = [
+    'CREATE TABLE "department" ("id" INTEGER NOT NULL PRIMARY KEY, "name" VARCHAR(100) NOT NULL, '
+    '"code" VARCHAR(10) NOT NULL)',
+    'CREATE UNIQUE INDEX "department_name" ON "department" ("name")',
+    'CREATE UNIQUE INDEX "department_code" ON "department" ("code")',
+    'CREATE TABLE "student" ("id" INTEGER NOT NULL PRIMARY KEY, "full_name" VARCHAR(200) NOT NULL, '
+    '"student_id" VARCHAR(20) NOT NULL, "department_id" INTEGER NOT NULL, "created_at" DATETIME NOT NULL, '
+    'FOREIGN KEY ("department_id") REFERENCES "department" ("id"))',
+    'CREATE UNIQUE INDEX "student_student_id" ON "student" ("student_id")',
+    'CREATE INDEX "student_department_id" ON "student" ("department_id")',
+    'CREATE TABLE "scholarship" ("id" INTEGER NOT NULL PRIMARY KEY, "number" INTEGER NOT NULL, '
+    '"date" DATE NOT NULL, "student_id" INTEGER NOT NULL, "amount" DECIMAL(10, 2) NOT NULL, '
+    '"destination" VARCHAR(200) NOT NULL, "created_at" DATETIME NOT NULL, '
+    'FOREIGN KEY ("student_id") REFERENCES "student" ("id"))',
+    'CREATE UNIQUE INDEX "scholarship_number" ON "scholarship" ("number")',
+    'CREATE INDEX "scholarship_student_id" ON "scholarship" ("student_id")',
+]
+
+
+def fill(departments=3, students=30, scholarships=300, seed=1):
+    rng = random.Random(seed)
+    department_rows = [Department.create(name=f'Факультет {i}', code=f'Ф{i}') for i in range(departments)]
+    student_rows = [Student.create(full_name=f'Студентов Семён {i}', student_id=f's{i}',
+                                   department=rng.choice(department_rows))
+                    for i in range(students)]
+    for number in range(1, scholarships + 1):
+        Scholarship.create(number=number, date=date(2024, 1, 1) + timedelta(days=rng.randrange(365)),
+                           student=rng.choice(student_rows), amount=rng.randrange(100, 10000) / 100,
+                           destination=rng.choice(['Банк', 'Военкомат', 'Налоговая']))
+    return rng
+
+
+def shuffle_rows(rng, steps=200):
+    """Случайные вставки, удаления, правки справок и переводы студентов"""
+    departments = [pk for pk, in Department.select(Department.id).tuples()]
+    number = Scholarship.select(Scholarship.number).order_by(Scholarship.number.desc()).scalar()
+    for _ in range(steps):
+        students = [pk for pk, in Student.select(Student.id).tuples()]
+        scholarships = [pk for pk, in Scholarship.select(Scholarship.id).tuples()]
+        action = rng.randrange(5 if len(students) > 10 else 4)
+        if action == 0:
+            number += 1
+            Scholarship.create(number=number, date=f'2025-{rng.randrange(1, 13):02d}-15',
+                               student=rng.choice(students), amount=rng.randrange(100, 10000) / 100,
+                               destination='Пенсионный фонд')
+        elif action == 1:
+            Scholarship.delete().where(Scholarship.id == rng.choice(scholarships)).execute()
+        elif action == 2:
+            (Scholarship
+             .update(amount=rng.randrange(100, 10000) / 100, date=f'2023-{rng.randrange(1, 13):02d}-01',
+                     student=rng.choice(students))
+             .where(Scholarship.id == rng.choice(scholarships))
+             .execute())
+        elif action == 3:
+            Student.update(department=rng.choice(departments)).where(Student.id == rng.choice(students)).execute()
+        else:
+            student = rng.choice(students)
+            Scholarship.delete().where(Scholarship.student == student).execute()
+            Student.delete().where(Student.id == student).execute()
+
+
+def counters():
+    return (list(Student.select(Student.id, Student.scholarship_count).order_by(Student.id).tuples()),
+            list(Department.select(Department.id, Department.student_count).order_by(Department.id).tuples()))
+
+
+def summary():
+    return list(MonthlySummary
+                .select(MonthlySummary.department, MonthlySummary.month,
+                        MonthlySummary.scholarship_count, MonthlySummary.total_amount)
+                .order_by(MonthlySummary.department, MonthlySummary.month)
+                .tuples())
+
+
+def search_results():
+    return ([student.id for student in search_students('семен', limit=100)],
+            [scholarship.id for scholarship in search_scholarships('пенсионный', limit=100)],
+            [scholarship.id for scholarship in search_scholarships('банк', limit=100)])
+
+
+def version(table):
+    return TableVersion.get(TableVersion.name == table).version
+
+
+def test_counters_match_recount(database):
+    shuffle_rows(fill())
+    by_triggers = counters()
+    refresh_counters()
+    assert counters() == by_triggers
+
+
+def test_summary_matches_rebuild(database):
+    shuffle_rows(fill())
+    by_triggers = summary()
+    rebuild_summary()
+    assert summary() == by_triggers
+    assert all(count > 0 for _, _, count, _ in by_triggers)
+
+
+def test_search_index_matches_rebuild(database):
+    shuffle_rows(fill())
+    by_triggers = search_results()
+    rebuild_search_index()
+    assert search_results() == by_triggers
+    assert all(by_triggers)
+
+
+def test_search_folds_yo(database):
+    fill(scholarships=0)
+    assert len(search_students('Семен', limit=100)) == len(search_students('семён', limit=100)) == 30
+
+
+def test_table_version_bumps_on_every_change(database):
+    department = Department.create(name='Факультет', code='Ф')
+    student = Student.create(full_name='Иванов', student_id='1', department=department)
+    before = {table: version(table) for table in ('department', 'student', 'scholarship')}
+
+    scholarship = Scholarship.create(number=1, date='2024-01-01', student=student, amount=10,
+                                     destination='Банк')
+    assert version('scholarship') == before['scholarship'] + 1
+    Scholarship.update(amount=20).where(Scholarship.id == scholarship.id).execute()
+    assert version('scholarship') == before['scholarship'] + 2
+    scholarship.delete_instance()
+    assert version('scholarship') == before['scholarship'] + 3
+    # Счетчик справок у студента меняется триггером, и это тоже изменение таблицы student
+    assert version('student') > before['student']
+    assert version('department') == before['department']
+
+
+def test_migrate_version_0_database(tmp_path):
+    configure_database(str(tmp_path / 'old.db'))
+    with db:
+        for sql in VERSION_0_SCHEMA:
+            db.execute_sql(sql)
+        db.execute_sql("INSERT INTO department (id, name, code) VALUES (1, 'Факультет', 'Ф'), (2, 'Другой', 'Д')")
+        db.execute_sql("INSERT INTO student VALUES (1, 'Семёнов', 's1', 1, '2024-01-01'), "
+                       "(2, 'Петров', 's2', 2, '2024-01-01')")
+        db.execute_sql("INSERT INTO scholarship VALUES (1, 1, '2024-01-10', 1, 100.5, 'Банк', '2024-01-01'), "
+                       "(2, 2, '2024-01-20', 1, 200, 'Банк', '2024-01-01'), "
+                       "(3, 3, '2024-02-01', 2, 50, 'Военкомат', '2024-01-01')")
+        assert schema_version() == 0
+
+        applied = migrate_database()
+        assert len(applied) == SCHEMA_VERSION
+        assert schema_version() == SCHEMA_VERSION
+        assert counters() == ([(1, 2), (2, 1)], [(1, 1), (2, 1)])
+        assert summary() == [(1, '2024-01', 2, 300.5), (2, '2024-02', 1, 50)]
+        assert [student.id for student in search_students('семен')] == [1]
+        assert 'scholarship_student_id' not in {index.name for index in db.get_indexes('scholarship')}
+
+        # Повторный запуск ничего не применяет, а триггеры уже работают
+        assert migrate_database() == []
+        Student.update(department=2).where(Student.id == 1).execute()
+        assert counters()[1] == [(1, 0), (2, 2)]
+        assert summary() == [(2, '2024-01', 2, 300.5), (2, '2024-02', 1, 50)]
+
+
+def test_restore_schema_objects(database):
+    fill()
+    db.execute_sql('DROP TRIGGER summary_insert')
+    db.execute_sql('DROP INDEX scholarship_amount')
+    Scholarship.create(number=1000, date='2030-05-05', student=Student.get(), amount=1, destination='Банк')
+
+    assert set(restore_schema_objects()) == {'summary_insert', 'scholarship_amount'}
+    # Пропущенная триггером справка учтена пересчетом
+    assert MonthlySummary.get(MonthlySummary.month == '2030-05').scholarship_count == 1
+    assert restore_schema_objects() == []
+
+
+def test_bulk_load_rebuilds_derived_data(database):
+    fill(scholarships=50)
+    students = [pk for pk, in Student.select(Student.id).tuples()]
+    with bulk_load_scholarships():
+        Scholarship.insert_many([
+            {'number': number, 'date': f'2026-{number % 12 + 1:02d}-01', 'student': students[number % len(students)],
+             'amount': number, 'destination': 'Пенсионный фонд'}
+            for number in range(100, 400)
+        ]).execute()
+
+    by_load = summary(), search_results(), counters()
+    rebuild_summary()
+    rebuild_search_index()
+    refresh_counters()
+    assert (summary(), search_results(), counters()) == by_load
+    assert restore_schema_objects() == []
+
+
+def test_bulk_load_needs_exclusive_access(database, tmp_path):
+    import sqlite3
+    from models import ExclusiveAccessError
+
+    other = sqlite3.connect(str(tmp_path / 'test.db'))
+    other.execute('BEGIN IMMEDIATE')
+    try:
+        configure_database(str(tmp_path / 'test.db'), busy_timeout=0)
+        db.connect(reuse_if_open=True)
+        with pytest.raises(ExclusiveAccessError):
+            with bulk_load_scholarships():
+                pass
+    finally:
+        other.rollback()
+        other.close()
+    db.close()
+    db.connect()
+    assert restore_schema_objects() == []
@@ -1,23 +1,140 @@
 import csv
+import os
+from array import array
 from datetime import datetime
+from itertools import islice
+
+from fourth import ScholarshipCollection, append_csv_rows, atomic_file, matching_snapshot
+
+try:
+    import numpy as np
+except ImportError:  # без NumPy работают функции над списками словарей
+    np = None
 
 FILENAME = 'data.csv'
+FIELDNAMES = ['№', 'дата', 'ФИО студента', 'размер стипендии', 'куда выдается справка']
+NUMERIC_FIELDS = {'№': 'int64', 'размер стипендии': 'float64'}
+# Тип array и преобразование значения для числовых колонок при потоковом чтении таблицы
+ARRAY_TYPES = {'int64': ('q', int), 'float64': ('d', float)}
+# Записей в одной пачке iter_batches
+DEFAULT_BATCH_SIZE = 10000
+# Размер CSV после последнего чтения или записи этим процессом (абсолютный путь -> байты):
+# все, что дописано за ним и не завершено, - хвост оборванного append_data
+_committed_sizes = {}
+
+def remember_size(filename, size=None):
+    """Запоминает размер файла как целиком прочитанный или записанный."""
+    _committed_sizes[os.path.abspath(filename)] = os.path.getsize(filename) if size is None else size
+
+def convert_record(row):
+    """Преобразует числовые поля записи к нужным типам."""
+    row['№'] = int(row['№'])
+    row['размер стипендии'] = float(row['размер стипендии'])
+    # Можно преобразовать дату в datetime, если нужно
+    # row['дата'] = datetime.strptime(row['дата'], '%Y-%m-%d')
+    return row
+
+def iter_records(filename):
+    """Генератор записей CSV по одной, с преобразованием типов (файл читается построчно)."""
+    with open(filename, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            yield convert_record(row)
+
+def iter_batches(filename, batch_size=DEFAULT_BATCH_SIZE):
+    """Генератор списков не больше batch_size записей из CSV."""
+    records = iter_records(filename)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
 
 def read_data(filename):
     """Считывает данные из CSV в список словарей."""
-    with open(filename, encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        data = list(reader)
-    # Преобразуем числовые поля к нужным типам
-    for row in data:
-        row['№'] = int(row['№'])
-        row['размер стипендии'] = float(row['размер стипендии'])
-        # Можно преобразовать дату в datetime, если нужно
-        # row['дата'] = datetime.strptime(row['дата'], '%Y-%m-%d')
-    return data
+    records = list(iter_records(filename))
+    remember_size(filename)
+    return records
+
+def collection_records(collection):
+    """Список словарей из коллекции fourth.ScholarshipCollection."""
+    columns = collection.to_columns()
+    return [dict(zip(FIELDNAMES, row)) for row in zip(*(columns[name] for name in FIELDNAMES))]
+
+def read_snapshot(filename):
+    """Считывает данные из двоичного снимка (см. fourth.ScholarshipCollection.save_snapshot) в список словарей."""
+    return collection_records(ScholarshipCollection.load_snapshot(filename))
+
+def load_data(filename):
+    """Список словарей из снимка рядом с CSV (data.snap), если он сделан из этой версии CSV, иначе из CSV."""
+    collection = matching_snapshot(filename)
+    if collection is None:
+        return read_data(filename)
+    remember_size(filename, collection._persisted[2])
+    return collection_records(collection)
+
+# Табличный режим: колонки в массивах NumPy ({поле: массив}), операции над
+# ними векторные. Функции сортировки, фильтрации и сводки ниже принимают и
+# таблицу, и список словарей.
+
+def read_table(filename):
+    """Считывает CSV в таблицу {поле: массив NumPy}.
+
+    Файл читается построчно: числовые значения сразу копятся в array (8 байт
+    на значение), строковые - в списки. Строка с другим числом полей, чем в
+    заголовке, или с нечисловым значением в числовом поле - ошибка ValueError
+    с номером строки.
+    """
+    if np is None:
+        raise RuntimeError("Для табличного режима нужен NumPy (pip install numpy)")
+    with open(filename, encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, FIELDNAMES)
+        columns = []
+        converters = []
+        for name in header:
+            if name in NUMERIC_FIELDS:
+                typecode, convert = ARRAY_TYPES[NUMERIC_FIELDS[name]]
+                columns.append(array(typecode))
+                converters.append(convert)
+            else:
+                columns.append([])
+                converters.append(str)
+        for row in reader:
+            if not row:
+                continue
+            if len(row) != len(header):
+                raise ValueError(f"{filename}, строка {reader.line_num}: полей {len(row)}, "
+                                 f"а в заголовке {len(header)}")
+            try:
+                for column, convert, value in zip(columns, converters, row):
+                    column.append(convert(value))
+            except ValueError as e:
+                raise ValueError(f"{filename}, строка {reader.line_num}: {e}") from None
+    table = {}
+    for name, values in zip(header, columns):
+        if name in NUMERIC_FIELDS:
+            table[name] = np.frombuffer(values, dtype=NUMERIC_FIELDS[name])
+        else:
+            table[name] = np.array(values, dtype=str)
+    return table
+
+def is_table(data):
+    """Данные в табличном режиме (а не список словарей)."""
+    return isinstance(data, dict)
+
+def table_take(table, selector):
+    """Строки таблицы по маске или массиву индексов."""
+    return {name: column[selector] for name, column in table.items()}
+
+def table_records(table):
+    """Преобразует таблицу в список словарей."""
+    columns = {name: column.tolist() for name, column in table.items()}
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
 
 def print_data(data):
     """Выводит данные в табличном виде."""
+    if is_table(data):
+        data = table_records(data)
     print(f"{'№':<3} {'Дата':<12} {'ФИО студента':<25} {'Стипендия':<10} {'Куда выдается'}")
     print('-' * 70)
     for d in data:
@@ -25,16 +142,78 @@ def print_data(data):
 
 def sort_by_string_field(data, field):
     """Сортирует по строковому полю."""
+    if is_table(data):
+        return table_take(data, np.argsort(np.char.lower(data[field]), kind='stable'))
     return sorted(data, key=lambda x: x[field].lower())
 
 def sort_by_numeric_field(data, field):
     """Сортирует по числовому полю."""
+    if is_table(data):
+        return table_take(data, np.argsort(data[field], kind='stable'))
     return sorted(data, key=lambda x: x[field])
 
 def filter_by_scholarship(data, min_amount):
     """Фильтрует записи, где размер стипендии больше min_amount."""
+    if is_table(data):
+        return table_take(data, data['размер стипендии'] > min_amount)
     return [d for d in data if d['размер стипендии'] > min_amount]
 
+def percentile(sorted_values, q):
+    """Перцентиль q (0-100) отсортированного списка с линейной интерполяцией, как в NumPy."""
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def scholarship_stats(data, percentiles=(50, 90, 99)):
+    """Сумма, среднее и перцентили размера стипендии."""
+    if is_table(data):
+        amounts = data['размер стипендии']
+        if not len(amounts):
+            return {'count': 0, 'sum': 0.0, 'mean': None, 'percentiles': {}}
+        values = np.percentile(amounts, percentiles)
+        return {
+            'count': len(amounts),
+            'sum': float(amounts.sum()),
+            'mean': float(amounts.mean()),
+            'percentiles': dict(zip(percentiles, values.tolist())),
+        }
+    amounts = sorted(d['размер стипендии'] for d in data)
+    if not amounts:
+        return {'count': 0, 'sum': 0.0, 'mean': None, 'percentiles': {}}
+    total = sum(amounts)
+    return {
+        'count': len(amounts),
+        'sum': total,
+        'mean': total / len(amounts),
+        'percentiles': {q: percentile(amounts, q) for q in percentiles},
+    }
+
+def iter_filter_by_scholarship(records, min_amount):
+    """Генератор записей с размером стипендии больше min_amount (для потока iter_records)."""
+    return (d for d in records if d['размер стипендии'] > min_amount)
+
+def scholarship_totals(records):
+    """Количество, сумма, минимум, максимум и среднее размера стипендии за один проход."""
+    count = 0
+    total = 0.0
+    minimum = maximum = None
+    for d in records:
+        amount = d['размер стипендии']
+        count += 1
+        total += amount
+        if minimum is None or amount < minimum:
+            minimum = amount
+        if maximum is None or amount > maximum:
+            maximum = amount
+    return {
+        'count': count,
+        'total': total,
+        'min': minimum,
+        'max': maximum,
+        'mean': total / count if count else None,
+    }
+
 def add_record(data):
     """Добавляет новую запись, запрашивая данные у пользователя."""
     print("Добавление новой справки:")
@@ -56,26 +235,48 @@ def add_record(data):
     data.append(new_record)
     print("Запись добавлена.")
 
+def to_row(d):
+    """Преобразует числовые поля записи обратно в строки для записи."""
+    return {
+        '№': str(d['№']),
+        'дата': d['дата'],
+        'ФИО студента': d['ФИО студента'],
+        'размер стипендии': str(d['размер стипендии']),
+        'куда выдается справка': d['куда выдается справка']
+    }
+
 def save_data(filename, data):
-    """Сохраняет данные обратно в CSV."""
-    with open(filename, 'w', newline='', encoding='utf-8') as f:
-        fieldnames = ['№', 'дата', 'ФИО студента', 'размер стипендии', 'куда выдается справка']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+    """Сохраняет данные обратно в CSV (полная перезапись, она же уплотнение файла).
+
+    Данные пишутся во временный файл, который затем атомарно заменяет
+    filename: при сбое во время записи остается прежняя версия файла.
+    """
+    with atomic_file(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
         writer.writeheader()
-        for d in data:
-            # Преобразуем числовые поля обратно в строки для записи
-            row = {
-                '№': str(d['№']),
-                'дата': d['дата'],
-                'ФИО студента': d['ФИО студента'],
-                'размер стипендии': str(d['размер стипендии']),
-                'куда выдается справка': d['куда выдается справка']
-            }
-            writer.writerow(row)
+        writer.writerows(map(to_row, data))
+    remember_size(filename)
     print(f"Данные сохранены в файл {filename}")
 
+def append_data(filename, records):
+    """Дописывает новые записи в конец CSV с fsync (стоимость - по числу записей, а не размеру файла).
+
+    Все, что в файле сверх размера после последнего чтения или записи этим
+    процессом, - хвост оборванного дописывания, и он отрезается; последняя
+    запись без перевода строки в пределах этого размера сохраняется. Если
+    файл процессом не читался, отрезается любая незавершенная последняя
+    строка (см. fourth.append_csv_rows).
+    """
+    if not os.path.exists(filename):
+        save_data(filename, records)
+        return
+    size = append_csv_rows(filename, ([row[name] for name in FIELDNAMES] for row in map(to_row, records)),
+                           expected_size=_committed_sizes.get(os.path.abspath(filename)))
+    remember_size(filename, size)
+    print(f"Добавлено записей в файл {filename}: {len(records)}")
+
 def main():
-    data = read_data(FILENAME)
+    data = load_data(FILENAME)
     print("Исходные данные:")
     print_data(data)
 
@@ -99,10 +300,11 @@ def main():
     print_data(filtered)
 
     # Добавление новой записи
+    saved_count = len(data)
     add_record(data)
 
-    # Сохраняем данные обратно в файл
-    save_data(FILENAME, data)
+    # Дописываем в файл только новые записи
+    append_data(FILENAME, data[saved_count:])
 
 if __name__ == '__main__':
     main()
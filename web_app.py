@@ -1,227 +1,332 @@
 import cherrypy
 from models import *
 from datetime import datetime
+from urllib.parse import urlencode
+import csv
+import io
+import json
 import os
+import templates
+from caching import cached_page, page_cache
+from metrics import registry as metrics_registry, metrics_exposed, PROMETHEUS_CONTENT_TYPE
+from search import search_students, search_scholarships, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT
+from reports import monthly_totals, report_years, grand_total
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Сколько строк таблицы отправлять одним фрагментом потокового ответа
+STREAM_BATCH_SIZE = 200
+# Сколько студентов возвращает подсказка выбора студента в формах справок
+STUDENT_LOOKUP_LIMIT = 10
+
+
+def parse_cursor(cursor):
+    """Разбирает курсор страницы вида 'YYYY-MM-DD_номер' в пару (дата, номер)"""
+    try:
+        date_str, number = cursor.split('_', 1)
+        datetime.strptime(date_str, '%Y-%m-%d')
+        return date_str, int(number)
+    except ValueError:
+        raise cherrypy.HTTPError(400, "Некорректный курсор страницы")
+
+
+def make_cursor(scholarship):
+    """Формирует курсор страницы по ключу (дата, номер) справки"""
+    return f"{scholarship.date}_{scholarship.number}"
+
+
+def student_label(student):
+    """Подпись студента в поле выбора: ФИО, номер и факультет"""
+    return f"{student.full_name} ({student.student_id}, {student.department.name})"
+
+
+def student_choice(student_id):
+    """Пара (id, подпись) выбранного студента для формы; пустые строки, если его нет"""
+    try:
+        student = (Student
+                   .select(Student, Department)
+                   .join(Department)
+                   .where(Student.id == int(student_id))
+                   .get())
+    except (TypeError, ValueError, Student.DoesNotExist):
+        return '', ''
+    return student.id, student_label(student)
+
+
+def paginate_scholarships(query, after=None, before=None, per_page=DEFAULT_PAGE_SIZE, order='asc'):
+    """Keyset-пагинация справок по (date, number).
+
+    Вместо OFFSET страница ищется по индексу от ключа последней (или первой)
+    показанной записи, поэтому дальние страницы стоят столько же, сколько первая.
+    Возвращает (записи, курсор предыдущей страницы, курсор следующей страницы).
+    """
+    key = Tuple(Scholarship.date, Scholarship.number)
+    ascending = order == 'asc'
+    backwards = before is not None
+
+    if after is not None:
+        query = query.where(key > Tuple(*after) if ascending else key < Tuple(*after))
+    if before is not None:
+        query = query.where(key < Tuple(*before) if ascending else key > Tuple(*before))
+
+    # При переходе назад идем по индексу в обратную сторону и разворачиваем результат
+    if ascending != backwards:
+        query = query.order_by(Scholarship.date.asc(), Scholarship.number.asc())
+    else:
+        query = query.order_by(Scholarship.date.desc(), Scholarship.number.desc())
+
+    rows = list(query.limit(per_page + 1))
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return rows, None, None
+    has_prev = has_more if backwards else after is not None
+    has_next = True if backwards else has_more
+    prev_cursor = make_cursor(rows[0]) if has_prev else None
+    next_cursor = make_cursor(rows[-1]) if has_next else None
+    return rows, prev_cursor, next_cursor
+
+
+def open_connection(thread_index):
+    """Открывает соединение с БД для рабочего потока CherryPy (один раз на поток)"""
+    db.connect(reuse_if_open=True)
+
+
+def close_connection(thread_index):
+    """Закрывает соединение рабочего потока при его остановке"""
+    if not db.is_closed():
+        db.close()
+
+
+def subscribe_database(engine=cherrypy.engine):
+    """Привязывает соединения с БД к жизненному циклу потоков CherryPy"""
+    engine.subscribe('start_thread', open_connection)
+    engine.subscribe('stop_thread', close_connection)
+
+
+def stream_rows(rows, render_row, batch_size=STREAM_BATCH_SIZE):
+    """Генератор HTML-фрагментов строк таблицы, склеенных пачками по batch_size"""
+    batch = []
+    for row in rows:
+        batch.append(render_row(row))
+        if len(batch) >= batch_size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+EXPORT_FIELDS = ['№', 'дата', 'ФИО студента', 'размер стипендии', 'куда выдается справка',
+                 'номер студента', 'факультет']
+
+
+def parse_date_param(value, name):
+    """Проверяет параметр-дату вида YYYY-MM-DD (400 при ошибке)"""
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise cherrypy.HTTPError(400, f"Некорректная дата в параметре {name}")
+    return value
+
+
+def export_query(date_from=None, date_to=None, department=None):
+    """Справки для выгрузки в виде кортежей в порядке EXPORT_FIELDS.
+
+    Фильтры: диапазон дат (включительно) и код факультета. Порядок по (date, number)
+    идет по индексу, поэтому курсор отдает строки без сортировки в памяти.
+    """
+    query = (Scholarship
+             .select(Scholarship.number, Scholarship.date, Student.full_name, Scholarship.amount,
+                     Scholarship.destination, Student.student_id, Department.code)
+             .join(Student)
+             .join(Department)
+             .order_by(Scholarship.date, Scholarship.number))
+    if date_from:
+        query = query.where(Scholarship.date >= parse_date_param(date_from, 'date_from'))
+    if date_to:
+        query = query.where(Scholarship.date <= parse_date_param(date_to, 'date_to'))
+    if department:
+        if not Department.select().where(Department.code == department).exists():
+            raise cherrypy.HTTPError(400, f"Неизвестный факультет: {department}")
+        query = query.where(Department.code == department)
+    return query.tuples()
+
+
+def stream_csv(rows, header, batch_size=STREAM_BATCH_SIZE):
+    """Генератор CSV в UTF-8, отдаваемого пачками по batch_size строк"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % batch_size == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def export_record(row):
+    """Строка выгрузки в формате JSON Lines"""
+    record = dict(zip(EXPORT_FIELDS, row))
+    record['размер стипендии'] = float(record['размер стипендии'])
+    record['дата'] = str(record['дата'])
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
 
 class ScholarshipWebApp:
 
     @cherrypy.expose
-    def index(self):
-        """Главная страница со списком всех справок"""
-        scholarships = Scholarship.select().join(Student).join(Department)
-
-        html = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Система управления справками о стипендиях</title>
-            <meta charset="utf-8">
-            <style>
-                body { font-family: Arial, sans-serif; margin: 20px; }
-                table { border-collapse: collapse; width: 100%; margin: 20px 0; }
-                th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
-                th { background-color: #f2f2f2; }
-                .btn { padding: 8px 16px; margin: 5px; text-decoration: none; 
-                       background-color: #007bff; color: white; border-radius: 4px; }
-                .btn:hover { background-color: #0056b3; }
-                .btn-danger { background-color: #dc3545; }
-                .btn-danger:hover { background-color: #c82333; }
-                .container { max-width: 1200px; margin: 0 auto; }
-                .nav { margin-bottom: 20px; }
-                .nav a { margin-right: 15px; }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>Система управления справками о стипендиях</h1>
-                
-                <div class="nav">
-                    <a href="/" class="btn">Главная</a>
-                    <a href="/students" class="btn">Студенты</a>
-                    <a href="/departments" class="btn">Факультеты</a>
-                    <a href="/add_scholarship" class="btn">Добавить справку</a>
-                </div>
-                
-                <h2>Список справок о стипендиях</h2>
-                <table>
-                    <thead>
-                        <tr>
-                            <th>№</th>
-                            <th>Дата</th>
-                            <th>Студент</th>
-                            <th>Факультет</th>
-                            <th>Размер стипендии</th>
-                            <th>Куда выдается</th>
-                            <th>Действия</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-        """
-
-        for scholarship in scholarships:
-            html += f"""
-                        <tr>
-                            <td>{scholarship.number}</td>
-                            <td>{scholarship.date}</td>
-                            <td>{scholarship.student.full_name}</td>
-                            <td>{scholarship.student.department.name}</td>
-                            <td>{scholarship.amount} руб.</td>
-                            <td>{scholarship.destination}</td>
-                            <td>
-                                <a href="/edit_scholarship/{scholarship.id}" class="btn">Редактировать</a>
-                                <a href="/delete_scholarship/{scholarship.id}" class="btn btn-danger" 
-                                   onclick="return confirm('Вы уверены?')">Удалить</a>
-                            </td>
-                        </tr>
-            """
-
-        html += """
-                    </tbody>
-                </table>
-            </div>
-        </body>
-        </html>
-        """
-        return html
+    @cherrypy.config(**{'response.stream': True})
+    @cached_page(Scholarship, Student, Department)
+    def index(self, after=None, before=None, per_page=DEFAULT_PAGE_SIZE, order='asc'):
+        """Главная страница со списком справок (постранично)"""
+        try:
+            per_page = min(max(int(per_page), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            per_page = DEFAULT_PAGE_SIZE
+        if order not in ('asc', 'desc'):
+            order = 'asc'
+
+        query = (Scholarship
+                 .select(Scholarship, Student, Department)
+                 .join(Student)
+                 .join(Department))
+        scholarships, prev_cursor, next_cursor = paginate_scholarships(
+            query,
+            after=parse_cursor(after) if after else None,
+            before=parse_cursor(before) if before else None,
+            per_page=per_page,
+            order=order
+        )
+
+        def page_url(**params):
+            return '/?' + urlencode(dict(params, per_page=per_page, order=order))
+
+        reverse_order = 'desc' if order == 'asc' else 'asc'
+        order_label = 'по убыванию' if order == 'asc' else 'по возрастанию'
+        pagination = ['<div class="pagination">']
+        if prev_cursor:
+            pagination.append(templates.page_link(page_url(before=prev_cursor), '← Назад'))
+        if next_cursor:
+            pagination.append(templates.page_link(page_url(after=next_cursor), 'Вперед →'))
+        pagination.append(templates.page_link(
+            '/?' + urlencode({'per_page': per_page, 'order': reverse_order}),
+            f'Сортировать {order_label}'
+        ))
+        pagination.append(templates.page_size_form(order, ''.join(
+            templates.page_size_option(size, per_page) for size in templates.PAGE_SIZES
+        )))
+        pagination.append('</div>')
+
+        page = templates.INDEX_PAGE
+
+        def render():
+            yield page.head + templates.table_heading('Список справок о стипендиях') + templates.SCHOLARSHIP_TABLE_HEAD
+            yield from stream_rows(scholarships, templates.scholarship_row)
+            yield templates.TABLE_TAIL + ''.join(pagination) + page.tail
+        return render()
 
     @cherrypy.expose
+    @cherrypy.config(**{'response.stream': True})
+    @cached_page(Student, Department)
     def students(self):
         """Страница со списком студентов"""
-        students = Student.select().join(Department)
-
-        html = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Студенты</title>
-            <meta charset="utf-8">
-            <style>
-                body { font-family: Arial, sans-serif; margin: 20px; }
-                table { border-collapse: collapse; width: 100%; margin: 20px 0; }
-                th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
-                th { background-color: #f2f2f2; }
-                .btn { padding: 8px 16px; margin: 5px; text-decoration: none; 
-                       background-color: #007bff; color: white; border-radius: 4px; }
-                .btn:hover { background-color: #0056b3; }
-                .container { max-width: 1200px; margin: 0 auto; }
-                .nav { margin-bottom: 20px; }
-                .nav a { margin-right: 15px; }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>Список студентов</h1>
-                
-                <div class="nav">
-                    <a href="/" class="btn">Главная</a>
-                    <a href="/students" class="btn">Студенты</a>
-                    <a href="/departments" class="btn">Факультеты</a>
-                    <a href="/add_student" class="btn">Добавить студента</a>
-                </div>
-                
-                <table>
-                    <thead>
-                        <tr>
-                            <th>ID</th>
-                            <th>ФИО</th>
-                            <th>Номер студента</th>
-                            <th>Факультет</th>
-                            <th>Количество справок</th>
-                            <th>Действия</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-        """
+        # Счетчик справок хранится в самой таблице, факультет берется тем же запросом
+        students = Student.select(Student, Department).join(Department)
+        page = templates.STUDENTS_PAGE
 
-        for student in students:
-            scholarship_count = student.scholarships.count()
-            html += f"""
-                        <tr>
-                            <td>{student.id}</td>
-                            <td>{student.full_name}</td>
-                            <td>{student.student_id}</td>
-                            <td>{student.department.name}</td>
-                            <td>{scholarship_count}</td>
-                            <td>
-                                <a href="/edit_student/{student.id}" class="btn">Редактировать</a>
-                            </td>
-                        </tr>
-            """
-
-        html += """
-                    </tbody>
-                </table>
-            </div>
-        </body>
-        </html>
-        """
-        return html
+        def render():
+            yield page.head + templates.STUDENT_TABLE_HEAD
+            yield from stream_rows(students.iterator(), templates.student_row)
+            yield templates.TABLE_TAIL + page.tail
+        return render()
 
     @cherrypy.expose
+    @cherrypy.config(**{'response.stream': True})
+    @cached_page(Department)
     def departments(self):
         """Страница со списком факультетов"""
         departments = Department.select()
+        page = templates.DEPARTMENTS_PAGE
 
-        html = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Факультеты</title>
-            <meta charset="utf-8">
-            <style>
-                body { font-family: Arial, sans-serif; margin: 20px; }
-                table { border-collapse: collapse; width: 100%; margin: 20px 0; }
-                th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
-                th { background-color: #f2f2f2; }
-                .btn { padding: 8px 16px; margin: 5px; text-decoration: none; 
-                       background-color: #007bff; color: white; border-radius: 4px; }
-                .btn:hover { background-color: #0056b3; }
-                .container { max-width: 1200px; margin: 0 auto; }
-                .nav { margin-bottom: 20px; }
-                .nav a { margin-right: 15px; }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>Список факультетов</h1>
-                
-                <div class="nav">
-                    <a href="/" class="btn">Главная</a>
-                    <a href="/students" class="btn">Студенты</a>
-                    <a href="/departments" class="btn">Факультеты</a>
-                </div>
-                
-                <table>
-                    <thead>
-                        <tr>
-                            <th>ID</th>
-                            <th>Название</th>
-                            <th>Код</th>
-                            <th>Количество студентов</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-        """
+        def render():
+            yield page.head + templates.DEPARTMENT_TABLE_HEAD
+            yield from stream_rows(departments.iterator(), templates.department_row)
+            yield templates.TABLE_TAIL + page.tail
+        return render()
 
-        for dept in departments:
-            student_count = dept.students.count()
-            html += f"""
-                        <tr>
-                            <td>{dept.id}</td>
-                            <td>{dept.name}</td>
-                            <td>{dept.code}</td>
-                            <td>{student_count}</td>
-                        </tr>
-            """
-
-        html += """
-                    </tbody>
-                </table>
-            </div>
-        </body>
-        </html>
+    @cherrypy.expose
+    @cached_page(Scholarship, Student, Department)
+    def search(self, q='', limit=DEFAULT_SEARCH_LIMIT):
+        """Поиск студентов по ФИО/номеру и справок по месту выдачи"""
+        try:
+            limit = min(max(int(limit), 1), MAX_SEARCH_LIMIT)
+        except ValueError:
+            limit = DEFAULT_SEARCH_LIMIT
+
+        parts = [templates.search_form(q)]
+        if q.strip():
+            students = search_students(q, limit)
+            scholarships = search_scholarships(q, limit)
+            if students:
+                parts.append(templates.table_heading('Студенты'))
+                parts.append(templates.STUDENT_TABLE_HEAD)
+                parts.append(templates.render_many(templates.student_row, students))
+                parts.append(templates.TABLE_TAIL)
+            if scholarships:
+                parts.append(templates.table_heading('Справки'))
+                parts.append(templates.SCHOLARSHIP_TABLE_HEAD)
+                parts.append(templates.render_many(templates.scholarship_row, scholarships))
+                parts.append(templates.TABLE_TAIL)
+            if not students and not scholarships:
+                parts.append(templates.NOTHING_FOUND)
+        return templates.SEARCH_PAGE.render(*parts)
+
+    @cherrypy.expose
+    @cached_page(Scholarship, Student, Department)
+    def reports(self, year='', department=''):
+        """Суммы и количество справок по факультетам и месяцам (из сводной таблицы)"""
+        try:
+            rows = list(monthly_totals(year, department))
+        except ValueError as e:
+            raise cherrypy.HTTPError(400, str(e))
+
+        year_options = ''.join(templates.report_option(y, y, year) for y in report_years())
+        department_options = ''.join(templates.report_option(d.code, d.name, department)
+                                     for d in Department.select().order_by(Department.name))
+        parts = [templates.report_filter_form(year_options, department_options)]
+        if rows:
+            parts.append(templates.REPORT_TABLE_HEAD)
+            parts.append(templates.render_many(templates.report_row, rows))
+            parts.append(templates.report_total_row(*grand_total(rows)))
+            parts.append(templates.TABLE_TAIL)
+        else:
+            parts.append(templates.NOTHING_FOUND)
+        return templates.REPORTS_PAGE.render(*parts)
+
+    @cherrypy.expose
+    @cherrypy.config(**{'tools.response_headers.on': True,
+                        'tools.response_headers.headers': [('Content-Type', 'application/json; charset=utf-8')],
+                        # Кодировать в UTF-8 и ответ не text/*, чтобы кешировался str, как у страниц
+                        'tools.encode.text_only': False})
+    @cached_page(Student, Department)
+    def student_lookup(self, q='', limit=STUDENT_LOOKUP_LIMIT):
+        """Подсказка для выбора студента в формах (/student_lookup?q=...): JSON [{id, label}].
+
+        Ищет по префиксам слов ФИО и номера студента в полнотекстовом индексе,
+        поэтому стоимость не зависит от числа студентов.
         """
-        return html
+        try:
+            limit = min(max(int(limit), 1), MAX_SEARCH_LIMIT)
+        except ValueError:
+            limit = STUDENT_LOOKUP_LIMIT
+        students = search_students(q, limit) if q.strip() else []
+        return json.dumps([{'id': student.id, 'label': student_label(student)} for student in students],
+                          ensure_ascii=False)
 
     @cherrypy.expose
     def add_scholarship(self, **kwargs):
@@ -247,6 +352,7 @@ class ScholarshipWebApp:
                     amount=float(amount),
                     destination=destination
                 )
+                page_cache.invalidate()
                 raise cherrypy.HTTPRedirect("/")
             except ValueError as e:
                 error_msg = f"Ошибка валидации: {str(e)}"
@@ -256,86 +362,12 @@ class ScholarshipWebApp:
                 else:
                     raise
 
-        students = Student.select().join(Department)
-
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Добавить справку</title>
-            <meta charset="utf-8">
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                .btn {{ padding: 8px 16px; margin: 5px; text-decoration: none; 
-                       background-color: #007bff; color: white; border-radius: 4px; border: none; cursor: pointer; }}
-                .btn:hover {{ background-color: #0056b3; }}
-                .btn-secondary {{ background-color: #6c757d; }}
-                .btn-secondary:hover {{ background-color: #545b62; }}
-                .form-group {{ margin: 15px 0; }}
-                .form-group label {{ display: inline-block; width: 150px; font-weight: bold; }}
-                .form-group input, .form-group select {{ padding: 8px; width: 250px; border: 1px solid #ddd; border-radius: 4px; }}
-                .container {{ max-width: 800px; margin: 0 auto; }}
-                .nav {{ margin-bottom: 20px; }}
-                .nav a {{ margin-right: 15px; }}
-                .error {{ color: red; margin: 10px 0; padding: 10px; background-color: #f8d7da; border-radius: 4px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>Добавить справку о стипендии</h1>
-                
-                <div class="nav">
-                    <a href="/" class="btn">Главная</a>
-                    <a href="/students" class="btn">Студенты</a>
-                    <a href="/departments" class="btn">Факультеты</a>
-                </div>
-                
-                {f'<div class="error">{error_msg}</div>' if error_msg else ''}
-                
-                <form method="post">
-                    <div class="form-group">
-                        <label for="number">Номер справки:</label>
-                        <input type="number" id="number" name="number" required min="1">
-                    </div>
-                    
-                    <div class="form-group">
-                        <label for="date">Дата:</label>
-                        <input type="date" id="date" name="date" required>
-                    </div>
-                    
-                    <div class="form-group">
-                        <label for="student_id">Студент:</label>
-                        <select id="student_id" name="student_id" required>
-                            <option value="">Выберите студента</option>
-        """
-
-        for student in students:
-            html += f'<option value="{student.id}">{student.full_name} ({student.department.name})</option>'
-
-        html += """
-                        </select>
-                    </div>
-                    
-                    <div class="form-group">
-                        <label for="amount">Размер стипендии:</label>
-                        <input type="number" step="0.01" id="amount" name="amount" required min="0">
-                    </div>
-                    
-                    <div class="form-group">
-                        <label for="destination">Куда выдается:</label>
-                        <input type="text" id="destination" name="destination" required maxlength="200">
-                    </div>
-                    
-                    <div class="form-group">
-                        <button type="submit" class="btn">Добавить справку</button>
-                        <a href="/" class="btn btn-secondary">Отмена</a>
-                    </div>
-                </form>
-            </div>
-        </body>
-        </html>
-        """
-        return html
+        student_id, student = student_choice(kwargs.get('student_id'))
+        return templates.ADD_SCHOLARSHIP_PAGE.render(
+            templates.render_error(error_msg),
+            templates.scholarship_form({'student_id': student_id, 'student': student}, 'Добавить справку'),
+            templates.STUDENT_PICKER_SCRIPT
+        )
 
     @cherrypy.expose
     def edit_scholarship(self, scholarship_id, **kwargs):
@@ -365,6 +397,7 @@ class ScholarshipWebApp:
                 scholarship.amount = float(amount)
                 scholarship.destination = destination
                 scholarship.save()
+                page_cache.invalidate()
 
                 raise cherrypy.HTTPRedirect("/")
             except ValueError as e:
@@ -375,87 +408,20 @@ class ScholarshipWebApp:
                 else:
                     raise
 
-        students = Student.select().join(Department)
-
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Редактирование справки</title>
-            <meta charset="utf-8">
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                .btn {{ padding: 8px 16px; margin: 5px; text-decoration: none; 
-                       background-color: #007bff; color: white; border-radius: 4px; border: none; cursor: pointer; }}
-                .btn:hover {{ background-color: #0056b3; }}
-                .btn-secondary {{ background-color: #6c757d; }}
-                .btn-secondary:hover {{ background-color: #545b62; }}
-                .form-group {{ margin: 15px 0; }}
-                .form-group label {{ display: inline-block; width: 150px; font-weight: bold; }}
-                .form-group input, .form-group select {{ padding: 8px; width: 250px; border: 1px solid #ddd; border-radius: 4px; }}
-                .container {{ max-width: 800px; margin: 0 auto; }}
-                .nav {{ margin-bottom: 20px; }}
-                .nav a {{ margin-right: 15px; }}
-                .error {{ color: red; margin: 10px 0; padding: 10px; background-color: #f8d7da; border-radius: 4px; }}
-                .success {{ color: green; margin: 10px 0; padding: 10px; background-color: #d4edda; border-radius: 4px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>Редактирование справки</h1>
-                
-                <div class="nav">
-                    <a href="/" class="btn">Главная</a>
-                    <a href="/students" class="btn">Студенты</a>
-                    <a href="/departments" class="btn">Факультеты</a>
-                </div>
-                
-                {f'<div class="error">{error_msg}</div>' if error_msg else ''}
-                
-                <form method="post">
-                    <div class="form-group">
-                        <label for="number">Номер справки:</label>
-                        <input type="number" id="number" name="number" required min="1" value="{scholarship.number}">
-                    </div>
-                    
-                    <div class="form-group">
-                        <label for="date">Дата:</label>
-                        <input type="date" id="date" name="date" required value="{scholarship.date}">
-                    </div>
-                    
-                    <div class="form-group">
-                        <label for="student_id">Студент:</label>
-                        <select id="student_id" name="student_id" required>
-                            <option value="">Выберите студента</option>
-        """
-
-        for student in students:
-            html += f'<option value="{student.id}" {"selected" if student.id == scholarship.student.id else ""}>{student.full_name} ({student.department.name})</option>'
-
-        html += """
-                        </select>
-                    </div>
-                    
-                    <div class="form-group">
-                        <label for="amount">Размер стипендии:</label>
-                        <input type="number" step="0.01" id="amount" name="amount" required min="0" value="{scholarship.amount}">
-                    </div>
-                    
-                    <div class="form-group">
-                        <label for="destination">Куда выдается:</label>
-                        <input type="text" id="destination" name="destination" required maxlength="200" value="{scholarship.destination}">
-                    </div>
-                    
-                    <div class="form-group">
-                        <button type="submit" class="btn">Сохранить изменения</button>
-                        <a href="/" class="btn btn-secondary">Отмена</a>
-                    </div>
-                </form>
-            </div>
-        </body>
-        </html>
-        """
-        return html
+        student_id, student = student_choice(scholarship.student_id)
+        values = {
+            'number': scholarship.number,
+            'date': scholarship.date,
+            'student_id': student_id,
+            'student': student,
+            'amount': scholarship.amount,
+            'destination': scholarship.destination
+        }
+        return templates.EDIT_SCHOLARSHIP_PAGE.render(
+            templates.render_error(error_msg),
+            templates.scholarship_form(values, 'Сохранить изменения'),
+            templates.STUDENT_PICKER_SCRIPT
+        )
 
     @cherrypy.expose
     def add_student(self, full_name=None, student_id=None, department_id=None):
@@ -470,75 +436,40 @@ class ScholarshipWebApp:
                     student_id=student_id,
                     department=department
                 )
+                page_cache.invalidate()
                 raise cherrypy.HTTPRedirect("/students")
             except Exception as e:
                 error_msg = f"Ошибка при добавлении студента: {str(e)}"
 
         departments = Department.select()
 
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Добавить студента</title>
-            <meta charset="utf-8">
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                .btn {{ padding: 8px 16px; margin: 5px; text-decoration: none; 
-                       background-color: #007bff; color: white; border-radius: 4px; border: none; cursor: pointer; }}
-                .btn:hover {{ background-color: #0056b3; }}
-                .form-group {{ margin: 10px 0; }}
-                .form-group label {{ display: inline-block; width: 150px; }}
-                .form-group input, .form-group select {{ padding: 5px; width: 200px; }}
-                .container {{ max-width: 800px; margin: 0 auto; }}
-                .nav {{ margin-bottom: 20px; }}
-                .nav a {{ margin-right: 15px; }}
-                .error {{ color: red; margin: 10px 0; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>Добавить студента</h1>
-                
-                <div class="nav">
-                    <a href="/" class="btn">Главная</a>
-                    <a href="/students" class="btn">Студенты</a>
-                    <a href="/departments" class="btn">Факультеты</a>
-                </div>
-                
-                {f'<div class="error">{error_msg}</div>' if error_msg else ''}
-                
-                <form method="post">
-                    <div class="form-group">
-                        <label for="full_name">ФИО:</label>
-                        <input type="text" id="full_name" name="full_name" required>
-                    </div>
-                    
-                    <div class="form-group">
-                        <label for="student_id">Номер студента:</label>
-                        <input type="text" id="student_id" name="student_id" required>
-                    </div>
-                    
-                    <div class="form-group">
-                        <label for="department_id">Факультет:</label>
-                        <select id="department_id" name="department_id" required>
-                            <option value="">Выберите факультет</option>
-        """
+        return templates.ADD_STUDENT_PAGE.render(
+            templates.render_error(error_msg),
+            templates.student_form(templates.render_many(templates.department_option, departments.iterator()))
+        )
 
-        for dept in departments:
-            html += f'<option value="{dept.id}">{dept.name}</option>'
-
-        html += """
-                        </select>
-                    </div>
-                    
-                    <div class="form-group">
-                        <button type="submit" class="btn">Добавить студента</button>
-                        <a href="/students" class="btn" style="background-color: #6c757d;">Отмена</a>
-                    </div>
-                </form>
-            </div>
-        </body>
-        </html>
-        """
-        return html
\ No newline at end of file
+    @cherrypy.expose
+    @cherrypy.config(**{'response.stream': True})
+    def export_csv(self, date_from=None, date_to=None, department=None):
+        """Выгрузка справок в CSV (/export.csv) напрямую из курсора БД"""
+        rows = export_query(date_from, date_to, department).iterator()
+        cherrypy.response.headers['Content-Type'] = 'text/csv; charset=utf-8'
+        cherrypy.response.headers['Content-Disposition'] = 'attachment; filename="scholarships.csv"'
+        return stream_csv(rows, EXPORT_FIELDS)
+
+    @cherrypy.expose
+    @cherrypy.config(**{'response.stream': True})
+    def export_jsonl(self, date_from=None, date_to=None, department=None):
+        """Выгрузка справок в JSON Lines (/export.jsonl) напрямую из курсора БД"""
+        rows = export_query(date_from, date_to, department).iterator()
+        cherrypy.response.headers['Content-Type'] = 'application/x-ndjson; charset=utf-8'
+        cherrypy.response.headers['Content-Disposition'] = 'attachment; filename="scholarships.jsonl"'
+        return (chunk.encode('utf-8') for chunk in stream_rows(rows, export_record))
+
+    @cherrypy.expose
+    def metrics(self):
+        """Метрики запросов и SQL в текстовом формате Prometheus (/metrics), если они открыты"""
+        if not metrics_exposed():
+            raise cherrypy.NotFound()
+        cherrypy.response.headers['Content-Type'] = PROMETHEUS_CONTENT_TYPE
+        return metrics_registry.render()